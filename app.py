@@ -1,12 +1,25 @@
 import streamlit as st
-import google.generativeai as genai
-import pandas as pd
-import json
-import plotly.express as px
 from datetime import datetime
-from fpdf import FPDF
-import tempfile
 import os
+import tempfile
+import time
+import uuid
+from health_architect.engine import generate_plan_stream
+from health_architect.sections import iter_plan_sections
+from health_architect.cache import PlanCache, profile_key
+from health_architect.report import generate_pdf
+from health_architect.history import open_history
+from health_architect.nutrition import compute_macros
+from health_architect.backends import backend_for_key, get_backend, is_quota_error
+from health_architect import render
+from health_architect.render import diet_table_html, workout_table_html
+from health_architect.metrics import BUCKETS_SECONDS, metrics
+from health_architect.scheduler import scheduler_from_env
+from health_architect.neighbors import NEAR_MATCH_DISTANCE, PlanIndex
+from health_architect.program import PROGRAM_WEEKS, ProgramPlanner
+from health_architect.who import score_value
+from health_architect.client import PlanClient, RemoteHistory
+from health_architect import export
 
 # ================= 1. CONFIGURATION =================
 st.set_page_config(
@@ -17,199 +30,179 @@ st.set_page_config(
 
 # ================= 2. API HANDLING =================
 api_key = None
+is_admin = os.environ.get("HEALTH_ARCHITECT_ADMIN") == "1"
+# With PLAN_API_URL set the app is a thin client of the plan service (health_architect/server.py).
+plan_api_url = os.environ.get("PLAN_API_URL")
 try:
     if "GEMINI_API_KEY" in st.secrets:
         api_key = st.secrets["GEMINI_API_KEY"]
+    is_admin = is_admin or bool(st.secrets.get("ADMIN_MODE", False))
+    plan_api_url = plan_api_url or st.secrets.get("PLAN_API_URL")
 except FileNotFoundError:
     pass
 
-if not api_key:
+@st.cache_resource
+def get_plan_api(url):
+    return PlanClient(url)
+
+plan_api = get_plan_api(plan_api_url) if plan_api_url else None
+
+if not api_key and plan_api is None:
     with st.sidebar:
         st.warning("⚠️ Running Locally")
         api_key = st.text_input("Enter Gemini API Key:", type="password", help="Enter your Google Gemini API Key here.")
 
-if api_key:
-    try:
-        genai.configure(api_key=api_key)
-    except Exception as e:
-        st.error(f"API Error: {e}")
+# Jobs run later on shared scheduler workers, so each one carries the backend of this session's key
+# (one Gemini client per key) instead of relying on a process-wide configuration.
+backend = backend_for_key(api_key) if plan_api is None else None
 
 # ================= 3. AI ENGINE =================
-def generate_plan_internal(age, bmi, activity, food, goal, budget, cuisine):
-    model = genai.GenerativeModel("gemini-2.5-flash")
-    prompt = f"""
-    Act as a professional Nutritionist. Return ONLY valid JSON.
-    PROFILE: Age: {age}, BMI: {bmi}, Activity: {activity}, Diet: {food}, Goal: {goal}
-    CONSTRAINTS: Budget: {budget}, Cuisine: {cuisine}.
-    JSON Structure:
-    {{
-      "overview": ["tip1", "tip2", "tip3"],
-      "macros": {{ "protein_grams": 0, "carbs_grams": 0, "fats_grams": 0, "daily_calories": 0 }},
-      "who_analysis": {{ "score": "8/10", "feedback": "Brief WHO analysis." }},
-      "diet": [ {{"day":"Mon", "breakfast":"...", "lunch":"...", "dinner":"..."}}, ... ],
-      "workout": [ {{"day":"Mon", "workout":"...", "duration":"...", "intensity":"..."}}, ... ]
-    }}
+@st.cache_resource
+def get_plan_cache():
+    return PlanCache()
+
+plan_cache = get_plan_cache()
+
+@st.cache_resource
+def get_history():
+    return RemoteHistory(plan_api) if plan_api else open_history()
+
+history = get_history()
+
+@st.cache_resource
+def get_scheduler():
+    return scheduler_from_env()
+
+scheduler = get_scheduler()
+
+@st.cache_resource
+def get_plan_index():
+    return PlanIndex()
+
+plan_index = get_plan_index()
+
+@st.cache_resource
+def get_program_planner():
+    return ProgramPlanner(history, scheduler)
+
+# Program weeks are built in-process with the local model backend, which a thin client has no key for.
+programs = get_program_planner() if plan_api is None else None
+HISTORY_PAGE_SIZE = 10
+EXPORTS = {"Diet days (CSV)": "diet", "Workout days (CSV)": "workout", "All plans as PDFs (ZIP)": "pdf"}
+EXPORT_PREFIX = "health_export_"
+EXPORT_TTL_SECONDS = 3600  # exports never downloaded (the session left) are removed by the next export after this
+RECENT_PLANS = 5  # full plans kept in session state; everything older lives in the history store
+
+with st.sidebar:
+    with st.expander("⚡ Plan Cache"):
+        st.json(plan_cache.snapshot())
+
+@st.fragment
+def performance_panel():
+    snap = metrics.snapshot()
+    st.json({"scheduler": scheduler.stats(), **snap["counters"]})
+    if not snap["stages"]:
+        st.caption("No requests recorded yet.")
+        return
+    stage = st.selectbox("Stage", sorted(snap["stages"]))
+    recent = sorted(snap["stages"][stage]["recent"])
+    labels = ["≤" + (f"{b * 1000:g}ms" if b < 1 else f"{b:g}s") for b in BUCKETS_SECONDS[:-1]] + [f">{BUCKETS_SECONDS[-2]:g}s"]
+    counts = [0] * len(BUCKETS_SECONDS)
+    for s in recent:
+        counts[next(i for i, b in enumerate(BUCKETS_SECONDS) if s <= b)] += 1
+    st.bar_chart({"bucket": labels, "requests": counts}, x="bucket", y="requests", height=200)
+    p50, p95 = recent[len(recent) // 2], recent[min(len(recent) - 1, int(len(recent) * 0.95))]
+    st.caption(f"{len(recent)} recent · p50 {p50 * 1000:.0f} ms · p95 {p95 * 1000:.0f} ms")
+
+if is_admin:
+    with st.sidebar:
+        with st.expander("📈 Performance (admin)"):
+            performance_panel()
+
+# ================= 4. RENDER HELPERS =================
+def render_metric_cards(m):
+    for col, card in zip(st.columns(4), render.metric_cards_html(m)):
+        with col: st.markdown(card, unsafe_allow_html=True)
+
+macro_figure = st.cache_data(max_entries=64)(render.macro_figure)
+
+def render_macro_chart(m, key=None):
+    st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+    st.plotly_chart(macro_figure(m['protein_grams'], m['carbs_grams'], m['fats_grams']), use_container_width=True, key=key)
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def render_who(who):
+    st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+    value = who["value"] if "value" in who else score_value(who["score"])
+    color = "#94a3b8" if value is None else "#22c55e" if value >= 8 else "#eab308" if value >= 6 else "#ef4444"
+    st.markdown(f"<h1 style='color:{color}; text-align:center;'>{who['score']}</h1>", unsafe_allow_html=True)
+    st.markdown("<p style='text-align:center;'>WHO Compliance Score</p>", unsafe_allow_html=True)
+    st.write(who['feedback'])
+    st.markdown('</div>', unsafe_allow_html=True)
+
+def stream_plan(events, macros=None, ticket=None):
+    """Render sections as they close; returns the finished plan dict (or {"error": ...}).
+
+    Locally computed `macros` are drawn at once, before waiting for the scheduler to start `ticket`.
     """
-    try:
-        res = model.generate_content(prompt)
-        clean_json = res.text.strip().replace("```json", "").replace("```", "")
-        return json.loads(clean_json)
-    except Exception as e:
-        return {"error": str(e)}
+    live = st.empty()
+    with live.container():
+        status = st.empty()
+        status.info("🧠 AI is analyzing budget, cuisine & nutrition...")
+        cards_slot = st.empty()
+        c_chart, c_score = st.columns([1.5, 1])
+        chart_slot, score_slot = c_chart.empty(), c_score.empty()
+        t1, t2 = st.tabs(["🍽️ Diet Plan", "🏋️ Workout Plan"])
+        diet_slot, workout_slot = t1.empty(), t2.empty()
+    if macros:
+        with cards_slot.container(): render_metric_cards(macros)
+        with chart_slot.container(): render_macro_chart(macros, key="live_macro_chart")
+    if ticket is not None:
+        while not ticket.started.wait(1.0):
+            status.info(f"⏳ High demand: you are #{scheduler.position(ticket)} in the queue (about {scheduler.eta(ticket):.0f}s).")
+        status.info("🧠 AI is analyzing budget, cuisine & nutrition...")
+    rows = {"diet": [], "workout": []}
+    for kind, key, value in events:
+        if kind in ("done", "error"):
+            live.empty()
+            return value
+        if kind == "item":
+            rows[key].append(value)
+            if key == "diet": diet_slot.markdown(diet_table_html(rows[key]), unsafe_allow_html=True)
+            else: workout_slot.markdown(workout_table_html(rows[key]), unsafe_allow_html=True)
+        elif key == "macros" and not macros:
+            with cards_slot.container(): render_metric_cards(value)
+            with chart_slot.container(): render_macro_chart(value, key="live_macro_chart")
+        elif key == "who_analysis":
+            with score_slot.container(): render_who(value)
+        status.info(f"🧠 Streaming plan... received {key}")
+    live.empty()
+    return {"error": "Plan stream ended unexpectedly."}
+
+# ================= 5. SESSION STATE =================
+def resolve_user_id():
+    """Stable owner of the plan history: the login email when auth is configured, otherwise an
+    id kept in the page URL (?uid=), so history survives refreshes, restarts and bookmarks."""
+    if st.user.get("is_logged_in") and st.user.get("email"):
+        return st.user["email"]
+    uid = st.query_params.get("uid")
+    if not uid:
+        uid = st.query_params["uid"] = uuid.uuid4().hex
+    return uid
 
-# ================= 4. SESSION STATE =================
 if "page" not in st.session_state: st.session_state.page = "Home"
+if "session_id" not in st.session_state: st.session_state.session_id = uuid.uuid4().hex
+if "user_id" not in st.session_state: st.session_state.user_id = resolve_user_id()
 if "plans" not in st.session_state: st.session_state.plans = []
 if "current_plan" not in st.session_state: st.session_state.current_plan = None
 if "view" not in st.session_state: st.session_state.view = "Current Plan"
 if "progress" not in st.session_state: st.session_state.progress = 0 
+if "program" not in st.session_state: st.session_state.program = None  # {"id", "profile", "macros"} of the 12-week program
 
-# ================= 5. ULTRA-PREMIUM CSS (FIXED) =================
-st.markdown("""
-<style>
-    @import url('https://fonts.googleapis.com/css2?family=Outfit:wght@300;400;600;800&display=swap');
-    html, body, [class*="css"] { font-family: 'Outfit', sans-serif; }
-    .stApp { background: radial-gradient(circle at 50% 10%, #2e1065 0%, #0f172a 40%, #000000 100%); color: #e2e8f0; }
-
-    /* GLASS CARDS */
-    .glass-card {
-        background: rgba(255, 255, 255, 0.05);
-        backdrop-filter: blur(12px);
-        border: 1px solid rgba(255, 255, 255, 0.1);
-        border-radius: 20px;
-        padding: 24px;
-        box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
-        margin-bottom: 24px;
-    }
-
-    /* --- NAVIGATION BUTTONS (3D GLASS EFFECT) --- */
-    /* Targets: Home Button AND Menu Trigger Button */
-    div.stButton > button, 
-    div[data-testid="stPopover"] > div > button {
-        background: rgba(255, 255, 255, 0.05) !important;
-        backdrop-filter: blur(10px) !important;
-        border: 1px solid rgba(255, 255, 255, 0.1) !important;
-        color: white !important;
-        padding: 12px 20px !important;
-        border-radius: 50px !important; /* Pill Shape */
-        font-weight: 600 !important;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1) !important;
-        width: 100% !important;
-        transition: all 0.3s ease !important;
-    }
-
-    /* Hover Effect (Neon Glow) */
-    div.stButton > button:hover, 
-    div[data-testid="stPopover"] > div > button:hover {
-        transform: translateY(-3px) !important;
-        box-shadow: 0 0 20px rgba(99, 102, 241, 0.6) !important;
-        border-color: #6366f1 !important;
-        background: rgba(99, 102, 241, 0.1) !important;
-    }
-    
-    /* Force Menu Icon Color to White */
-    div[data-testid="stPopover"] > div > button * {
-        color: white !important;
-        fill: white !important;
-    }
-
-    /* --- DROPDOWN MENU INTERIOR STYLING --- */
-    /* 1. Force the Dropdown Container to be Dark Blue */
-    div[data-testid="stPopoverBody"] {
-        background-color: #6366f1 !important;
-        border: 1px solid rgba(255,255,255,0.15) !important;
-        backdrop-filter: blur(10px);
-        -webkit-backdrop-filter: blur(10px);
-        color: #6366f1 !important;
-    }
-
-    /* 2. Style the Buttons INSIDE the Menu (Glass Effect) */
-    div[data-testid="stPopoverBody"] button {
-        background: rgba(255, 255, 255, 0.15) !important;
-        border: 1px solid rgba(255, 255, 255, 0.2) !important;
-        color: #6366f1 !important;
-        backdrop-filter: blur(10px);
-        -webkit-backdrop-filter: blur(10px);
-        border-radius: 50px !important; /* Pill Shape inside menu */
-        margin-bottom: 8px !important;
-        padding: 10px 15px !important;
-        transition: all 0.2s ease !important;
-    }
-
-    /* 3. Hover Effect for Menu Items */
-    div[data-testid="stPopoverBody"] button:hover {
-        background: rgba(99, 102, 241, 0.2) !important;
-        border-color: #6366f1 !important;
-        box-shadow: 0 0 10px rgba(99, 102, 241, 0.4) !important;
-        transform: translateX(5px) !important;
-    }
-
-    /* 4. Fix Icons inside Menu Items */
-    div[data-testid="stPopoverBody"] button * {
-        color: #6366f1 !important;
-        fill: #6366f1 !important;
-    }
-
-    /* --- COOL ANIMATED TITLE --- */
-    @keyframes shine {
-        0% { background-position: 0% 50%; }
-        50% { background-position: 100% 50%; }
-        100% { background-position: 0% 50%; }
-    }
-    .hero-title {
-        font-size: 3.5rem;
-        font-weight: 800;
-        background: linear-gradient(90deg, #a855f7, #3b82f6, #14b8a6, #a855f7);
-        background-size: 300% 300%;
-        -webkit-background-clip: text;
-        -webkit-text-fill-color: transparent;
-        text-align: center;
-        animation: shine 5s infinite linear;
-        margin-bottom: 5px;
-    }
-    .hero-subtitle { text-align: center; color: #94a3b8; margin-bottom: 25px; letter-spacing: 1px; }
-
-    /* --- 3D NEON METRIC CARDS --- */
-    .metric-card {
-        background: rgba(255, 255, 255, 0.03);
-        border: 1px solid rgba(255, 255, 255, 0.05);
-        border-radius: 20px;
-        padding: 20px;
-        text-align: center;
-        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
-        cursor: pointer;
-        position: relative;
-        overflow: hidden;
-        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
-    }
-    .metric-card:hover {
-        transform: translateY(-8px) scale(1.02);
-        box-shadow: 0 20px 40px rgba(0,0,0,0.4);
-        border: 1px solid rgba(255, 255, 255, 0.2);
-    }
-    .metric-card.cal:hover { box-shadow: 0 0 30px rgba(16, 185, 129, 0.3); border-color: #10b981; }
-    .metric-card.pro:hover { box-shadow: 0 0 30px rgba(168, 85, 247, 0.3); border-color: #a855f7; }
-    .metric-card.carb:hover { box-shadow: 0 0 30px rgba(59, 130, 246, 0.3); border-color: #3b82f6; }
-    .metric-card.fat:hover { box-shadow: 0 0 30px rgba(249, 115, 22, 0.3); border-color: #f97316; }
-    
-    .metric-value { font-size: 2.2rem; font-weight: 800; margin: 5px 0; }
-    .metric-label { font-size: 0.9rem; text-transform: uppercase; letter-spacing: 1px; opacity: 0.8; }
-
-    /* Download Button */
-    [data-testid="stDownloadButton"] > button {
-        background: linear-gradient(90deg, #10b981 0%, #3b82f6 100%) !important;
-        box-shadow: 0 0 15px rgba(16, 185, 129, 0.4) !important;
-        color: white !important;
-    }
-
-    /* Tables & Progress */
-    .styled-table th { background: linear-gradient(90deg, #6366f1, #8b5cf6); color: white; padding: 12px; }
-    .styled-table td { border-bottom: 1px solid rgba(255,255,255,0.1); padding: 10px; color: #e2e8f0; }
-    .stProgress > div > div > div > div { background-image: linear-gradient(90deg, #6366f1, #38bdf8); }
-</style>
-""", unsafe_allow_html=True)
-
-# ================= 6. HEADER & NAVIGATION =================
+# ================= 6. ULTRA-PREMIUM CSS (FIXED) =================
+st.markdown(render.APP_CSS, unsafe_allow_html=True)
+
+# ================= 7. HEADER & NAVIGATION =================
 st.markdown('<div class="hero-title">AI Health Architect</div>', unsafe_allow_html=True)
 st.markdown('<div class="hero-subtitle">INTELLIGENT • ADAPTIVE • PERSONALIZED</div>', unsafe_allow_html=True)
 
@@ -233,7 +226,280 @@ with nav_c2:
 
 st.divider()
 
-# ================= 7. PAGE LOGIC =================
+# ================= 8. FRAGMENTS =================
+# Each fragment reruns on its own when one of its widgets changes; only "Generate"
+# and "Update Progress" trigger a full-page rerun so the results panel picks them up.
+@st.fragment
+def biometrics_form():
+    st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+    st.subheader("⚙️ Biometrics")
+    c_a, c_s = st.columns(2)
+    with c_a: age = st.number_input("Age", 10, 100, 22)
+    with c_s: sex = st.selectbox("Sex", ["Male", "Female"])
+    c_h, c_w = st.columns(2)
+    with c_h: height = st.number_input("Height (cm)", 120, 220, 170)
+    with c_w: weight = st.number_input("Weight (kg)", 30, 200, 65)
+    
+    bmi = round(weight / ((height / 100) ** 2), 2)
+    st.info(f"BMI: {bmi}")
+    
+    st.subheader("🥗 Preferences")
+    activity = st.selectbox("Activity", ["Sedentary", "Moderate", "Active"])
+    food = st.selectbox("Diet Type", ["Vegetarian", "Non-Vegetarian", "Vegan"])
+    
+    # Problem Statement Inputs
+    budget = st.select_slider("Budget Constraint", options=["Student (Low Cost)", "Standard", "Premium"])
+    cuisine = st.text_input("Cuisine/Region", "South Indian", help="E.g., North Indian, Continental")
+    
+    goal = st.selectbox("Goal", ["Weight Loss", "Muscle Gain", "Maintenance"])
+    engine = st.radio("Engine", ["Streaming", "Parallel Sections"], horizontal=True, help="Parallel Sections splits the plan into concurrent sub-requests.")
+    st.markdown("---")
+    if st.button("✨ Generate Plan", use_container_width=True):
+        st.session_state.pending_profile = {
+            "age": age, "height": height, "weight": weight, "sex": sex, "bmi": bmi, "activity": activity, "food": food,
+            "goal": goal, "budget": budget, "cuisine": cuisine, "engine": engine,
+        }
+        st.rerun()
+    st.markdown('</div>', unsafe_allow_html=True)
+
+@st.fragment
+def progress_checkin():
+    with st.expander("📅 Weekly Progress Check-in"):
+        week_num = st.slider("Weeks Completed", 0, PROGRAM_WEEKS, st.session_state.progress)
+        if st.button("Update Progress"):
+            st.session_state.progress = week_num
+            program = st.session_state.program
+            if program:
+                # Build the coming week now so it is ready by the time the user opens it.
+                programs.prefetch(program["id"], week_num, program["profile"], program["macros"], st.session_state.session_id, backend)
+            st.success("Updated!")
+            st.rerun()
+
+def run_generation(profile):
+    if plan_api is None and not api_key and get_backend().requires_api_key:
+        st.warning("👈 Please enter API Key in sidebar.")
+        return
+    started = time.perf_counter()
+    args = [profile[k] for k in ("age", "bmi", "activity", "food", "goal", "budget", "cuisine")]
+    # Macros come from the local nutrition engine, so stream_plan draws the cards before the job is even dispatched.
+    macros = compute_macros(profile["age"], profile["height"], profile["weight"], profile["sex"], profile["activity"], profile["goal"])
+    key = profile_key(*args, macros=macros)
+    data, source = plan_cache.lookup(key) if plan_api is None else (None, "api")
+    if plan_api is not None:
+        # The service does the caching, queueing and storing; the app only renders the stream.
+        request = plan_api.generate(profile, st.session_state.session_id, st.session_state.user_id)
+        data = stream_plan(request.events(), macros)
+        plan_id, source = request.plan_id, f"api:{request.cache}"
+        if request.cache in ("memory", "disk"):
+            st.caption(f"⚡ Served instantly from the plan cache ({request.cache}).")
+    elif data is not None:
+        st.caption(f"⚡ Served instantly from the plan cache ({source}).")
+    else:
+        parallel = profile["engine"] == "Parallel Sections"
+        events = iter_plan_sections if parallel else generate_plan_stream
+        # Identical in-flight profiles under the same API key share one call; the rest wait their turn within the shared quota.
+        ticket = scheduler.submit((key, id(backend)), lambda: events(*args, macros=macros, backend=backend),
+                                  st.session_state.session_id, requests=3 if parallel else 1)
+        joined = ticket.subscribers > 1
+        if joined:
+            st.caption("🤝 Joined an identical request already in progress.")
+        # Meanwhile, show the closest plan generated for a similar profile.
+        preview = st.empty()
+        near = plan_index.search(profile, k=1, max_distance=NEAR_MATCH_DISTANCE)
+        if near:
+            with preview.container():
+                st.info("💡 While your personalised plan is generated, here is the closest plan we already have for a similar profile.")
+                t1, t2 = st.tabs(["🍽️ Similar Diet Plan", "🏋️ Similar Workout Plan"])
+                with t1: st.markdown(diet_table_html(near[0][1]["plan"]["diet"]), unsafe_allow_html=True)
+                with t2: st.markdown(workout_table_html(near[0][1]["plan"]["workout"]), unsafe_allow_html=True)
+        data = stream_plan(ticket.iter_events(), macros, ticket)
+        preview.empty()
+        if "error" not in data and not joined: plan_index.add(profile, data)
+        if "error" not in data: plan_cache.put(key, data, time.perf_counter() - started)
+    if "error" in data:
+        if is_quota_error(data["error"]): st.error("⚠️ The model is over its quota right now. Please try again in a few minutes.")
+        else: st.error(f"Error: {data['error']}")
+    else:
+        st.session_state.current_plan = {"date": datetime.now().strftime("%Y-%m-%d"), "data": data}
+        if plan_api is None:
+            plan_id = history.add(st.session_state.session_id, st.session_state.current_plan, goal=profile["goal"],
+                                  user_id=st.session_state.user_id)
+        st.session_state.plans = (st.session_state.plans + [(plan_id, st.session_state.current_plan)])[-RECENT_PLANS:]
+        if programs:
+            program_profile = {k: profile[k] for k in ("age", "bmi", "activity", "food", "goal", "budget", "cuisine")}
+            st.session_state.program = {"id": programs.start(data), "profile": program_profile, "macros": data["macros"]}
+    metrics.observe("generate_total", time.perf_counter() - started, engine=profile["engine"], cache=source, ok="error" not in data)
+    metrics.write_prometheus()
+
+@st.fragment
+def results_panel():
+    if st.session_state.progress > 0:
+        st.markdown('<div class="glass-card">', unsafe_allow_html=True)
+        st.markdown(f"**Journey Progress: Week {st.session_state.progress}/{PROGRAM_WEEKS}**")
+        st.progress(st.session_state.progress / PROGRAM_WEEKS)
+        st.markdown('</div>', unsafe_allow_html=True)
+
+    profile = st.session_state.pop("pending_profile", None)
+    if profile:
+        run_generation(profile)
+
+    entry = st.session_state.current_plan
+    program = st.session_state.program
+    if entry and programs is None:
+        st.caption("📆 12-week programs are only available when the app generates plans itself (without PLAN_API_URL).")
+    if entry and program:
+        unlocked = min(st.session_state.progress + 1, PROGRAM_WEEKS)
+        ready = min(programs.latest(program["id"]), unlocked)  # open on the newest week already built
+        week = st.selectbox("📆 Program Week", range(1, unlocked + 1), index=max(ready, 1) - 1)
+        week_plan = programs.get(program["id"], week) if week > 1 else None  # week 1 is the current plan itself
+        if week > 1 and week_plan is None:
+            ticket = programs.request(program["id"], week, program["profile"], program["macros"], st.session_state.session_id, backend)
+            with st.spinner(f"Adapting week {week} from last week's plan..."):
+                week_plan = ticket.result()
+            if "error" in week_plan:
+                st.error(f"Error: {week_plan['error']}")
+                week_plan = None
+        if week_plan:
+            entry = {"date": entry["date"], "data": week_plan}
+            changed = week_plan.get("changed", {})
+            st.caption(f"🔁 Week {week}: updated diet days {', '.join(changed.get('diet', [])) or 'none'}; "
+                       f"workout days {', '.join(changed.get('workout', [])) or 'none'}. Everything else carries over.")
+
+    if entry:
+        plan = entry["data"]
+        m = plan["macros"]
+        
+        # === 3D METRIC CARDS ===
+        render_metric_cards(m)
+        
+        st.write("")
+        
+        # Charts & Score
+        c_chart, c_score = st.columns([1.5, 1])
+        with c_chart: render_macro_chart(m)
+        with c_score: render_who(plan['who_analysis'])
+
+        # Tables
+        st.subheader("🗓️ Weekly Schedule")
+        t1, t2 = st.tabs(["🍽️ Diet Plan", "🏋️ Workout Plan"])
+        with t1: st.markdown(diet_table_html(plan["diet"]), unsafe_allow_html=True)
+        with t2: st.markdown(workout_table_html(plan["workout"]), unsafe_allow_html=True)
+
+        st.write("")
+        pdf = None
+        if plan_api and entry is st.session_state.current_plan:
+            try:
+                pdf = plan_api.get_pdf(st.session_state.plans[-1][0])
+            except OSError as e:
+                st.error(f"Plan service unavailable ({e}); the report below was rendered locally.")
+        st.download_button(
+            label="⬇️ Download Full PDF Report",
+            data=pdf or generate_pdf(entry),
+            file_name="My_AI_Health_Plan.pdf",
+            mime="application/pdf",
+            use_container_width=True
+        )
+    elif not profile:
+        st.markdown("""
+        <div style='text-align: center; padding: 50px; opacity: 0.6;'>
+            <h1>👈</h1>
+            <h3>Start Your Journey</h3>
+            <p>Enter your biometrics in the sidebar to generate a WHO-compliant plan.</p>
+        </div>
+        """, unsafe_allow_html=True)
+
+def sweep_exports():
+    """Remove export files left behind by sessions that prepared one and never downloaded it."""
+    cutoff = time.time() - EXPORT_TTL_SECONDS
+    tmp = tempfile.gettempdir()
+    for name in os.listdir(tmp):
+        path = os.path.join(tmp, name)
+        try:
+            if name.startswith(EXPORT_PREFIX) and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass  # already removed by another session
+
+def build_export(kind):
+    """Spool this session's plans to a temp file; returns (path, file name, mime type). Nothing is held in memory."""
+    sweep_exports()
+    entries = history.iter_entries(user_id=st.session_state.user_id)
+    suffix = ".zip" if kind == "pdf" else ".csv"
+    fd, path = tempfile.mkstemp(prefix=EXPORT_PREFIX, suffix=suffix)
+    try:
+        if kind == "pdf":
+            with os.fdopen(fd, "wb") as f:
+                export.write_pdf_zip(entries, f, workers=2, threads=True)
+            return path, "health_plans.zip", "application/zip"
+        with os.fdopen(fd, "w", newline="", encoding="utf-8") as f:
+            export.write_csv(export.plan_day_rows(entries, kind), export.TABLES[kind], f)
+        return path, f"{kind}.csv", "text/csv"
+    except BaseException:
+        os.remove(path)
+        raise
+
+def drop_export():
+    export_file = st.session_state.pop("export", None)
+    if export_file and os.path.exists(export_file[0]):
+        os.remove(export_file[0])
+
+def export_panel():
+    col1, col2 = st.columns([3, 1])
+    kind = EXPORTS[col1.selectbox("Export", list(EXPORTS), label_visibility="collapsed")]
+    if col2.button("Prepare export", use_container_width=True):
+        drop_export()
+        with st.spinner("Exporting..."):
+            try:
+                st.session_state.export = build_export(kind)
+            except OSError as e:
+                st.error(f"Export failed: {e}")
+    export_file = st.session_state.get("export")
+    if export_file:
+        path, name, mime = export_file
+        try:
+            with open(path, "rb") as f:
+                st.download_button(f"📦 Download {name}", f, file_name=name, mime=mime, on_click=drop_export)
+        except FileNotFoundError:  # expired and swept; prepare it again
+            st.session_state.pop("export", None)
+
+@st.fragment
+def history_view():
+    st.subheader("📜 Past Plans")
+    try:
+        total = history.count(user_id=st.session_state.user_id)
+    except OSError as e:  # the plan service is down (thin-client mode)
+        st.error(f"Could not load your history: {e}")
+        return
+    if not total:
+        st.info("No history found. Generate a plan to get started!")
+    else:
+        if not st.user.get("is_logged_in"):
+            st.caption("🔖 Your history is linked to this page's address; bookmark it to come back to your plans.")
+        export_panel()
+    pages = -(-total // HISTORY_PAGE_SIZE)
+    page = st.number_input(f"Page (of {pages})", 1, pages, 1) if pages > 1 else 1
+    recent = dict(st.session_state.plans)
+    try:
+        items = history.page(limit=HISTORY_PAGE_SIZE, offset=(page - 1) * HISTORY_PAGE_SIZE, user_id=st.session_state.user_id)
+    except OSError as e:
+        st.error(f"Could not load your history: {e}")
+        return
+    for p in items:
+        with st.expander(f"Plan created on {p['date']}" + (f" · {p['goal']}" if p['goal'] else "")):
+            st.json(p['macros'])
+            # Plan bodies are only loaded when asked for.
+            if st.toggle("Show full plan", key=f"history_{p['id']}"):
+                try:
+                    entry = recent.get(p['id']) or history.get(p['id'])
+                except OSError as e:
+                    st.error(f"Could not load this plan: {e}")
+                    continue
+                if entry is None:
+                    continue
+                st.markdown(diet_table_html(entry["data"]["diet"]), unsafe_allow_html=True)
+                st.markdown(workout_table_html(entry["data"]["workout"]), unsafe_allow_html=True)
+
+# ================= 9. PAGE LOGIC =================
 
 # --- PAGE: HOME ---
 if st.session_state.page == "Home":
@@ -244,187 +510,17 @@ if st.session_state.page == "Home":
         
         # SIDEBAR
         with left_col:
-            st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-            st.subheader("⚙️ Biometrics")
-            age = st.number_input("Age", 10, 100, 22)
-            c_h, c_w = st.columns(2)
-            with c_h: height = st.number_input("Height (cm)", 120, 220, 170)
-            with c_w: weight = st.number_input("Weight (kg)", 30, 200, 65)
-            
-            bmi = round(weight / ((height / 100) ** 2), 2)
-            st.info(f"BMI: {bmi}")
-            
-            st.subheader("🥗 Preferences")
-            activity = st.selectbox("Activity", ["Sedentary", "Moderate", "Active"])
-            food = st.selectbox("Diet Type", ["Vegetarian", "Non-Vegetarian", "Vegan"])
-            
-            # Problem Statement Inputs
-            budget = st.select_slider("Budget Constraint", options=["Student (Low Cost)", "Standard", "Premium"])
-            cuisine = st.text_input("Cuisine/Region", "South Indian", help="E.g., North Indian, Continental")
-            
-            goal = st.selectbox("Goal", ["Weight Loss", "Muscle Gain", "Maintenance"])
-            st.markdown("---")
-            generate = st.button("✨ Generate Plan", use_container_width=True)
-            st.markdown('</div>', unsafe_allow_html=True)
+            biometrics_form()
 
             # Weekly Progress
-            with st.expander("📅 Weekly Progress Check-in"):
-                week_num = st.slider("Weeks Completed", 0, 12, st.session_state.progress)
-                if st.button("Update Progress"):
-                    st.session_state.progress = week_num
-                    st.success("Updated!")
-                    st.rerun()
+            progress_checkin()
 
         # MAIN OUTPUT
         with right_col:
-            if st.session_state.progress > 0:
-                st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-                st.markdown(f"**Journey Progress: Week {st.session_state.progress}/12**")
-                st.progress(st.session_state.progress / 12)
-                st.markdown('</div>', unsafe_allow_html=True)
-
-            if generate:
-                if not api_key:
-                    st.warning("👈 Please enter API Key in sidebar.")
-                else:
-                    with st.spinner("🧠 AI is analyzing budget, cuisine & nutrition..."):
-                        data = generate_plan_internal(age, bmi, activity, food, goal, budget, cuisine)
-                        if "error" in data:
-                            if "429" in data["error"]: st.error("⚠️ Quota Exceeded. Try again tomorrow.")
-                            else: st.error(f"Error: {data['error']}")
-                        else:
-                            st.session_state.current_plan = {"date": datetime.now().strftime("%Y-%m-%d"), "data": data}
-                            st.session_state.plans.append(st.session_state.current_plan)
-
-            if st.session_state.current_plan:
-                plan = st.session_state.current_plan["data"]
-                m = plan["macros"]
-                
-                # === 3D METRIC CARDS ===
-                c1, c2, c3, c4 = st.columns(4)
-                with c1: st.markdown(f"""<div class="metric-card cal"><div style="font-size:2rem;">🔥</div><div class="metric-value" style="color:#10b981;">{m['daily_calories']}</div><div class="metric-label">Calories</div></div>""", unsafe_allow_html=True)
-                with c2: st.markdown(f"""<div class="metric-card pro"><div style="font-size:2rem;">🥩</div><div class="metric-value" style="color:#a855f7;">{m['protein_grams']}g</div><div class="metric-label">Protein</div></div>""", unsafe_allow_html=True)
-                with c3: st.markdown(f"""<div class="metric-card carb"><div style="font-size:2rem;">🍞</div><div class="metric-value" style="color:#3b82f6;">{m['carbs_grams']}g</div><div class="metric-label">Carbs</div></div>""", unsafe_allow_html=True)
-                with c4: st.markdown(f"""<div class="metric-card fat"><div style="font-size:2rem;">🥑</div><div class="metric-value" style="color:#f97316;">{m['fats_grams']}g</div><div class="metric-label">Fats</div></div>""", unsafe_allow_html=True)
-                
-                st.write("")
-                
-                # Charts & Score
-                c_chart, c_score = st.columns([1.5, 1])
-                with c_chart:
-                    st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-                    df = pd.DataFrame({"Macro":["P","C","F"], "Value":[m['protein_grams'], m['carbs_grams'], m['fats_grams']]})
-                    fig = px.pie(df, values="Value", names="Macro", hole=0.6, color_discrete_sequence=["#a855f7", "#3b82f6", "#f97316"])
-                    fig.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white", height=220, margin=dict(t=0,b=0,l=0,r=0))
-                    st.plotly_chart(fig, use_container_width=True)
-                    st.markdown('</div>', unsafe_allow_html=True)
-                with c_score:
-                    st.markdown('<div class="glass-card">', unsafe_allow_html=True)
-                    who = plan['who_analysis']
-                    color = "#22c55e" if "8" in who['score'] or "9" in who['score'] else "#eab308"
-                    st.markdown(f"<h1 style='color:{color}; text-align:center;'>{who['score']}</h1>", unsafe_allow_html=True)
-                    st.markdown("<p style='text-align:center;'>WHO Compliance Score</p>", unsafe_allow_html=True)
-                    st.write(who['feedback'])
-                    st.markdown('</div>', unsafe_allow_html=True)
-
-                # Tables
-                st.subheader("🗓️ Weekly Schedule")
-                t1, t2 = st.tabs(["🍽️ Diet Plan", "🏋️ Workout Plan"])
-                with t1:
-                    rows = "".join([f"<tr><td><strong>{r['day']}</strong></td><td>{r['breakfast']}</td><td>{r['lunch']}</td><td>{r['dinner']}</td></tr>" for r in plan["diet"]])
-                    st.markdown(f"<table class='styled-table'><thead><tr><th>Day</th><th>Breakfast</th><th>Lunch</th><th>Dinner</th></tr></thead><tbody>{rows}</tbody></table>", unsafe_allow_html=True)
-                with t2:
-                    rows = "".join([f"<tr><td><strong>{r['day']}</strong></td><td>{r['workout']}</td><td>{r['duration']}</td><td>{r['intensity']}</td></tr>" for r in plan["workout"]])
-                    st.markdown(f"<table class='styled-table'><thead><tr><th>Day</th><th>Focus</th><th>Duration</th><th>Intensity</th></tr></thead><tbody>{rows}</tbody></table>", unsafe_allow_html=True)
-
-                # PDF Logic
-                def safe_text(text): return text.encode("latin-1", "ignore").decode("latin-1")
-                class PDF(FPDF):
-                    def header(self):
-                        self.set_font('Arial', 'B', 20); self.set_text_color(99, 102, 241)
-                        self.cell(0, 10, 'AI Health Architect', 0, 1, 'C'); self.ln(5)
-                
-                def generate_pdf(plan):
-                    pdf = PDF(); pdf.add_page(); pdf.set_font("Arial", "I", 10); pdf.set_text_color(100)
-                    pdf.cell(0, 10, f"Generated: {plan['date']}", ln=True, align='C'); pdf.ln(5)
-                    pdf.set_font("Arial", "B", 12); pdf.set_text_color(0); pdf.cell(0, 8, "Overview", ln=True)
-                    pdf.set_font("Arial", size=10)
-                    for p in plan["data"]["overview"]: pdf.multi_cell(0, 6, safe_text(f"- {p}"))
-                    pdf.ln(5)
-                    
-                    def get_max_height(pdf, col_widths, data_row):
-                        max_h = 0
-                        for i, text in enumerate(data_row):
-                            lines = pdf.multi_cell(col_widths[i], 5, safe_text(text), split_only=True)
-                            h = len(lines) * 5
-                            if h > max_h: max_h = h
-                        return max(max_h, 8)
-
-                    # Diet Table
-                    pdf.set_font("Arial", "B", 14); pdf.set_text_color(99, 102, 241); pdf.cell(0, 10, "Diet Schedule", ln=True)
-                    headers, widths = ["Day", "Breakfast", "Lunch", "Dinner"], [25, 55, 55, 55]
-                    pdf.set_font("Arial", "B", 10); pdf.set_text_color(255); pdf.set_fill_color(99, 102, 241)
-                    for i, h in enumerate(headers): pdf.cell(widths[i], 8, h, 1, 0, 'C', 1)
-                    pdf.ln(); pdf.set_text_color(0); pdf.set_font("Arial", size=9)
-                    for r in plan["data"]["diet"]:
-                        row_data = [r['day'], r['breakfast'], r['lunch'], r['dinner']]
-                        h = get_max_height(pdf, widths, row_data)
-                        if pdf.get_y() + h > 270: pdf.add_page(); pdf.ln()
-                        x, y = pdf.get_x(), pdf.get_y()
-                        for i, text in enumerate(row_data):
-                            pdf.set_xy(x + sum(widths[:i]), y); pdf.multi_cell(widths[i], 5, safe_text(text), border=1)
-                            pdf.set_xy(x + sum(widths[:i]), y); pdf.rect(x + sum(widths[:i]), y, widths[i], h)
-                        pdf.set_y(y + h)
-                    
-                    # Workout Table
-                    pdf.ln(10)
-                    if pdf.get_y() > 250: pdf.add_page()
-                    pdf.set_font("Arial", "B", 14); pdf.set_text_color(99, 102, 241); pdf.cell(0, 10, "Workout Schedule", ln=True)
-                    w_headers, w_widths = ["Day", "Focus Area", "Duration", "Intensity"], [25, 80, 40, 45]
-                    pdf.set_font("Arial", "B", 10); pdf.set_text_color(255); pdf.set_fill_color(99, 102, 241)
-                    for i, h in enumerate(w_headers): pdf.cell(w_widths[i], 8, h, 1, 0, 'C', 1)
-                    pdf.ln(); pdf.set_text_color(0); pdf.set_font("Arial", size=9)
-                    for r in plan["data"]["workout"]:
-                        row_data = [r['day'], r['workout'], r['duration'], r['intensity']]
-                        h = get_max_height(pdf, w_widths, row_data)
-                        if pdf.get_y() + h > 270: pdf.add_page(); pdf.ln()
-                        x, y = pdf.get_x(), pdf.get_y()
-                        for i, text in enumerate(row_data):
-                            pdf.set_xy(x + sum(w_widths[:i]), y); pdf.multi_cell(w_widths[i], 5, safe_text(text), border=1)
-                            pdf.set_xy(x + sum(w_widths[:i]), y); pdf.rect(x + sum(w_widths[:i]), y, w_widths[i], h)
-                        pdf.set_y(y + h)
-
-                    tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".pdf")
-                    pdf.output(tmp.name)
-                    return tmp.name
-
-                st.write("")
-                pdf_file = generate_pdf(st.session_state.current_plan)
-                with open(pdf_file, "rb") as f:
-                    st.download_button(
-                        label="⬇️ Download Full PDF Report",
-                        data=f,
-                        file_name="My_AI_Health_Plan.pdf",
-                        mime="application/pdf",
-                        use_container_width=True
-                    )
-            else:
-                if not generate:
-                    st.markdown("""
-                    <div style='text-align: center; padding: 50px; opacity: 0.6;'>
-                        <h1>👈</h1>
-                        <h3>Start Your Journey</h3>
-                        <p>Enter your biometrics in the sidebar to generate a WHO-compliant plan.</p>
-                    </div>
-                    """, unsafe_allow_html=True)
+            results_panel()
 
     elif st.session_state.view == "History":
-        st.subheader("📜 Past Plans")
-        if not st.session_state.plans:
-            st.info("No history found. Generate a plan to get started!")
-        for p in reversed(st.session_state.plans):
-            with st.expander(f"Plan created on {p['date']}"):
-                st.json(p['data']['macros'])
+        history_view()
 
 # --- PAGE: ABOUT ---
 elif st.session_state.page == "About":
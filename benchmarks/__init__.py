@@ -0,0 +1 @@
+"""Benchmarks for the plan pipeline; run from the repo root, e.g. python -m benchmarks.bench_pipeline."""
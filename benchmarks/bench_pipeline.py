@@ -0,0 +1,62 @@
+"""Per-stage pipeline benchmark against the offline stub backend.
+
+    python -m benchmarks.bench_pipeline --sizes 7 28 84 --repeat 30
+
+Stages: end-to-end generation (blocking and streaming), JSON parsing (one-shot and
+incremental), HTML table building, chart construction and PDF rendering, each at
+several plan sizes (number of diet/workout days).
+"""
+import argparse
+from datetime import date
+
+from health_architect.backends import StubBackend
+from health_architect.engine import build_prompt, generate_plan_internal, generate_plan_stream, parse_plan
+from health_architect.render import diet_table_html, macro_figure, workout_table_html
+from health_architect.report import render_pdf
+from health_architect.streaming import IncrementalPlanParser
+
+from .common import measure, report
+
+PROFILE = (22, 22.5, "Moderate", "Vegetarian", "Maintenance", "Student (Low Cost)", "South Indian")
+
+
+def stages(days):
+    backend = StubBackend(days=days, latency=0, jitter=0, chunk_delay=0)
+    plan = backend.plan
+    text = backend.generate(build_prompt(*PROFILE)).text
+    chunks = [text[i:i + 64] for i in range(0, len(text), 64)]
+    entry = {"date": date.today().isoformat(), "data": plan}
+
+    def incremental_parse():
+        parser = IncrementalPlanParser()
+        for chunk in chunks:
+            parser.feed(chunk)
+
+    return {
+        "generate (blocking)": lambda: generate_plan_internal(*PROFILE, backend=backend),
+        "generate (stream)": lambda: list(generate_plan_stream(*PROFILE, backend=backend)),
+        "json parse": lambda: parse_plan(text),
+        "incremental parse": incremental_parse,
+        "html tables": lambda: (diet_table_html(plan["diet"]), workout_table_html(plan["workout"])),
+        "chart": lambda: macro_figure(plan["macros"]["protein_grams"], plan["macros"]["carbs_grams"], plan["macros"]["fats_grams"]),
+        "pdf render": lambda: render_pdf(entry),
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[7, 28, 84], help="plan sizes in days")
+    parser.add_argument("--repeat", type=int, default=30)
+    parser.add_argument("--json", action="store_true", help="print machine-readable results")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for days in args.sizes:
+        for name, fn in stages(days).items():
+            fn()  # warm-up (imports, font metrics, caches)
+            rows.append({"days": days, "stage": name, **measure(fn, args.repeat)})
+    report(rows, args.json)
+
+
+if __name__ == "__main__":
+    main()
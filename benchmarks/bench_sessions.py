@@ -0,0 +1,80 @@
+"""Concurrent-session load test of app.py through Streamlit's AppTest, using the stub backend.
+
+    python -m benchmarks.bench_sessions --sessions 20 --concurrency 5 --latency 0.2
+
+Every simulated session loads the Home page and clicks "Generate Plan" with its own
+profile (so the plan cache does not hide the model latency). Reports p50/p99 for the
+first page load and for the generate rerun, plus peak Python heap and process RSS.
+The app's shared scheduler gets an effectively unlimited RPM/TPM budget and one
+worker per concurrent session, so the run measures the pipeline rather than the
+production quota queue (pass --rpm to measure queueing under a real cap).
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from .common import report, summarize
+
+APP = str(Path(__file__).resolve().parent.parent / "app.py")
+
+
+def run_session(i, timeout):
+    from streamlit.testing.v1 import AppTest
+
+    at = AppTest.from_file(APP, default_timeout=timeout)
+    started = time.perf_counter()
+    at.run()
+    loaded = time.perf_counter()
+    at.number_input[0].set_value(18 + i % 60)
+    [b for b in at.button if "Generate" in b.label][0].click().run()
+    done = time.perf_counter()
+    if at.exception:
+        raise RuntimeError(at.exception[0].message)
+    return (loaded - started) * 1000, (done - loaded) * 1000
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=5)
+    parser.add_argument("--latency", type=float, default=0.2, help="stub time-to-first-token in seconds")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--rpm", type=int, default=1_000_000, help="scheduler requests-per-minute budget")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench_sessions_")
+    os.environ.update({
+        "LLM_BACKEND": "stub",
+        "STUB_LATENCY": str(args.latency),
+        "HISTORY_BACKEND": "memory",
+        "PLAN_CACHE_PATH": os.path.join(workdir, "plan_cache.sqlite3"),
+        "SCHEDULER_RPM": str(args.rpm),
+        "SCHEDULER_TPM": str(1_000_000_000),
+        "SCHEDULER_WORKERS": str(args.concurrency),
+    })
+
+    tracemalloc.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda i: run_session(i, args.timeout), range(args.sessions)))
+    elapsed = time.perf_counter() - started
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    rows = [
+        {"phase": "page load", **summarize([r[0] for r in results])},
+        {"phase": "generate", **summarize([r[1] for r in results])},
+    ]
+    report(rows, args.json)
+    print(f"\n{args.sessions} sessions x{args.concurrency} concurrent in {elapsed:.1f}s; "
+          f"peak python heap {peak / 2**20:.1f} MiB; max RSS {resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f} MiB")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Cold-start benchmark and import profile of app.py.
+
+    python -m benchmarks.bench_startup --runs 5 [--profile] [--budget-ms 3000] [--baseline REF]
+
+Every run is a fresh interpreter, as in a newly started container: it imports
+Streamlit and renders one page through AppTest with an API key in the secrets.
+Reports the first-render time per page and which heavy dependencies (Gemini SDK,
+pandas, Plotly, fpdf) that page loaded; none of them is needed before a plan is
+shown. --profile adds the slowest imports from `python -X importtime`. --baseline
+exports a git revision (e.g. the commit before the lazy imports) to a temporary
+directory, times the same pages there, and adds its p50 and the speedup to each
+row. Exits 1 if a page of the current tree loads a heavy dependency or its p50
+goes over --budget-ms, so it can run as a regression guard.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+from .common import report, summarize
+
+APP = str(Path(__file__).resolve().parent.parent / "app.py")
+PAGES = [("About", "Current Plan"), ("Contact", "Current Plan"), ("Home", "Current Plan"), ("Home", "History")]
+HEAVY = ("google.generativeai", "pandas", "plotly.express", "fpdf")  # Streamlit itself imports the plotly package root
+
+# Runs in the child interpreter: argv = app path, page, view.
+CHILD = """
+import json, sys, time
+started = time.perf_counter()
+from streamlit.testing.v1 import AppTest
+imported = time.perf_counter()
+at = AppTest.from_file(sys.argv[1], default_timeout=60)
+at.secrets["GEMINI_API_KEY"] = "bench-key"
+at.session_state["page"], at.session_state["view"] = sys.argv[2], sys.argv[3]
+at.run()
+done = time.perf_counter()
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "render_ms": (done - imported) * 1000,
+    "error": at.exception[0].message if at.exception else None,
+    "heavy": [m for m in %r if m in sys.modules],
+}))
+""" % (HEAVY,)
+
+
+def cold_start(page, view, env, importtime=False, app=APP):
+    cmd = [sys.executable, *(["-X", "importtime"] if importtime else []), "-c", CHILD, app, page, view]
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True, cwd=os.path.dirname(app))
+    if proc.returncode:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    if result["error"]:
+        raise RuntimeError(f"{page}/{view}: {result['error']}")
+    return result, proc.stderr
+
+
+def checkout(ref, workdir):
+    """Export the tree at git revision `ref` into `workdir`; returns the path of its app.py."""
+    repo = os.path.dirname(APP)
+    archive = subprocess.run(["git", "archive", "--format=tar", ref], cwd=repo, capture_output=True)
+    if archive.returncode:
+        raise SystemExit(f"cannot export baseline {ref!r}: {archive.stderr.decode().strip()}")
+    target = os.path.join(workdir, "baseline")
+    os.makedirs(target)
+    subprocess.run(["tar", "-x", "-C", target], input=archive.stdout, check=True)
+    return os.path.join(target, "app.py")
+
+
+def slowest_imports(importtime_log, top):
+    """Top-level imports by cumulative time from a -X importtime log, in milliseconds."""
+    rows = []
+    for line in importtime_log.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, name = line.split(":", 1)[1].split("|")
+        if not name.startswith("  "):  # nested imports are indented below their parent
+            rows.append({"module": name.strip(), "cumulative_ms": round(int(cumulative) / 1000, 1)})
+    return sorted(rows, key=lambda r: r["cumulative_ms"], reverse=True)[:top]
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5, help="cold starts per page")
+    parser.add_argument("--profile", action="store_true", help="also print the slowest imports of a Home page start")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--budget-ms", type=float, help="fail if any page's p50 first render exceeds this")
+    parser.add_argument("--baseline", metavar="REF", help="also time this git revision and report the speedup")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="bench_startup_")
+    env = dict(os.environ, LLM_BACKEND="gemini", HISTORY_BACKEND="memory",
+               PLAN_CACHE_PATH=os.path.join(workdir, "plan_cache.sqlite3"),
+               PLAN_INDEX_DIR=os.path.join(workdir, "plan_index"), FOOD_INDEX_DIR=os.path.join(workdir, "food_index"))
+    baseline = checkout(args.baseline, workdir) if args.baseline else None
+
+    rows, failures = [], []
+    for page, view in PAGES:
+        runs = [cold_start(page, view, env)[0] for _ in range(args.runs)]
+        heavy = sorted({m for r in runs for m in r["heavy"]})
+        row = {"page": page if page != "Home" else f"Home/{view}", **summarize([r["render_ms"] for r in runs]),
+               "streamlit_import_ms": round(sum(r["import_ms"] for r in runs) / len(runs), 1), "heavy_imports": ",".join(heavy) or "-"}
+        if baseline:
+            base = summarize([cold_start(page, view, env, app=baseline)[0]["render_ms"] for _ in range(args.runs)])
+            row["baseline_p50_ms"] = base["p50_ms"]
+            row["speedup"] = f"{base['p50_ms'] / row['p50_ms']:.2f}x" if row["p50_ms"] else "-"
+        rows.append(row)
+        if heavy:
+            failures.append(f"{row['page']} imported {', '.join(heavy)}")
+        if args.budget_ms and row["p50_ms"] > args.budget_ms:
+            failures.append(f"{row['page']} p50 {row['p50_ms']:.0f} ms > budget {args.budget_ms:.0f} ms")
+    report(rows, args.json)
+
+    if args.profile:
+        _, log = cold_start("Home", "Current Plan", env, importtime=True)
+        print()
+        report(slowest_imports(log, args.top), args.json)
+
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1 @@
+"""Plan generation core for AI Health Architect (kept free of Streamlit UI code)."""
@@ -0,0 +1,206 @@
+"""LLM backends behind the plan pipeline.
+
+GeminiBackend is the production backend. StubBackend replays a canned plan with
+configurable latency, jitter, chunking and error injection, so the pipeline can be
+benchmarked and regression-tested without network or quota. Pick one with
+LLM_BACKEND=gemini|stub (default gemini). backend_for_key() gives each API key its
+own Gemini client, so sessions that enter different keys never share one.
+"""
+import json
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+
+MODEL_NAME = "gemini-2.5-flash"
+DAYS = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+MAX_KEYED_BACKENDS = 32
+
+
+def is_quota_error(message):
+    message = message.lower()
+    return "429" in message or "quota" in message or "resource exhausted" in message
+
+
+class LLMResponse:
+    def __init__(self, text, usage=None):
+        self.text = text
+        self.usage = usage or {}
+
+
+def usage_from(response):
+    meta = getattr(response, "usage_metadata", None)
+    if meta is None:
+        return {}
+    return {
+        "prompt_tokens": getattr(meta, "prompt_token_count", 0) or 0,
+        "output_tokens": getattr(meta, "candidates_token_count", 0) or 0,
+        "total_tokens": getattr(meta, "total_token_count", 0) or 0,
+    }
+
+
+class LLMBackend:
+    name = "base"
+    requires_api_key = False
+
+    def generate(self, prompt, **config):
+        """Return an LLMResponse for the whole prompt."""
+        raise NotImplementedError
+
+    def stream(self, prompt, usage=None, **config):
+        """Yield text chunks as they arrive; token counts are written into `usage` when given."""
+        raise NotImplementedError
+
+
+class GeminiBackend(LLMBackend):
+    name = "gemini"
+    requires_api_key = True
+
+    def __init__(self, model_name=MODEL_NAME, api_key=None):
+        self.model_name = model_name
+        self.api_key = api_key
+        self._client = None
+        self._lock = threading.Lock()
+
+    def _generative_client(self):
+        # genai.configure() is process-global, so each key gets its own client from a private
+        # client manager instead; concurrent calls under different keys cannot cross over.
+        with self._lock:
+            if self._client is None:
+                from google.generativeai import client
+                manager = client._ClientManager()
+                manager.configure(api_key=self.api_key)
+                self._client = manager.get_default_client("generative")
+            return self._client
+
+    def _model(self, config):
+        import google.generativeai as genai  # imported on first use; it is the slowest dependency to load
+        model = genai.GenerativeModel(self.model_name, generation_config=config or None)
+        if self.api_key:
+            model._client = self._generative_client()
+        return model
+
+    def generate(self, prompt, **config):
+        res = self._model(config).generate_content(prompt)
+        return LLMResponse(res.text, usage_from(res))
+
+    def stream(self, prompt, usage=None, **config):
+        for chunk in self._model(config).generate_content(prompt, stream=True):
+            if usage is not None:
+                usage.update(usage_from(chunk))  # the final chunk carries the totals
+            yield chunk.text
+
+
+class StubQuotaError(Exception):
+    pass
+
+
+def sample_plan(days=7):
+    """Canned plan with `days` diet and workout rows (days > 7 repeats the week)."""
+    names = [DAYS[i % 7] if days <= 7 else f"W{i // 7 + 1} {DAYS[i % 7]}" for i in range(days)]
+    return {
+        "overview": ["Eat a protein source with every meal.", "Walk 8,000 steps daily.", "Sleep 7-8 hours."],
+        "macros": {"protein_grams": 110, "carbs_grams": 260, "fats_grams": 65, "daily_calories": 2060},
+        "who_analysis": {"score": "8/10", "feedback": "Balanced plan; keep free sugars under 10% of energy."},
+        "diet": [{"day": d, "breakfast": "Idli (3) with sambar and coconut chutney",
+                  "lunch": "Brown rice, rasam, beans poriyal and curd",
+                  "dinner": "2 chapati with moong dal and cucumber salad"} for d in names],
+        "workout": [{"day": d, "workout": "Full-body strength circuit", "duration": "45 min",
+                     "intensity": "Moderate"} for d in names],
+    }
+
+
+class StubBackend(LLMBackend):
+    """Offline backend replaying `plan` for whichever sections the prompt asks for."""
+
+    name = "stub"
+
+    def __init__(self, plan=None, days=7, latency=0.5, jitter=0.1, chunk_size=64, chunk_delay=0.005,
+                 error_rate=0.0, malformed_rate=0.0, seed=None):
+        self.plan = plan or sample_plan(days)
+        self.latency, self.jitter = latency, jitter
+        self.chunk_size, self.chunk_delay = chunk_size, chunk_delay
+        self.error_rate, self.malformed_rate = error_rate, malformed_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self.calls = 0
+
+    def _roll(self):
+        with self._lock:
+            self.calls += 1
+            return self._random.random(), self._random.random(), self._random.uniform(-self.jitter, self.jitter)
+
+    def _payload(self, prompt, compact=False):
+        plan = self.plan
+        if compact:
+            from .wire import encode
+            plan = encode(plan)
+        requested = {k: v for k, v in plan.items() if f'"{k}"' in prompt}
+        return requested or plan
+
+    def _render(self, prompt, config):
+        error_roll, malformed_roll, jitter = self._roll()
+        if error_roll < self.error_rate:
+            raise StubQuotaError("429 Resource has been exhausted (e.g. check quota).")
+        if "response_schema" in config:  # schema-constrained output is bare, compact JSON
+            return json.dumps(self._payload(prompt, compact=True), separators=(",", ":")), max(0.0, self.latency + jitter)
+        text = "```json\n" + json.dumps(self._payload(prompt), indent=1) + "\n```"
+        if malformed_roll < self.malformed_rate:
+            text = "Here is your personalised plan:\n" + text + "\nLet me know if you need changes!"
+        return text, max(0.0, self.latency + jitter)
+
+    def generate(self, prompt, **config):
+        text, delay = self._render(prompt, config)
+        time.sleep(delay)
+        return LLMResponse(text, {"prompt_tokens": len(prompt) // 4, "output_tokens": len(text) // 4,
+                                  "total_tokens": (len(prompt) + len(text)) // 4})
+
+    def stream(self, prompt, usage=None, **config):
+        text, delay = self._render(prompt, config)
+        if usage is not None:
+            usage.update(prompt_tokens=len(prompt) // 4, output_tokens=len(text) // 4, total_tokens=(len(prompt) + len(text)) // 4)
+        time.sleep(delay)  # time to first token
+        for i in range(0, len(text), self.chunk_size):
+            if i and self.chunk_delay:
+                time.sleep(self.chunk_delay)
+            yield text[i:i + self.chunk_size]
+
+
+_backend = None
+_backend_lock = threading.Lock()
+_keyed = OrderedDict()  # api key -> GeminiBackend using it, least recently used first
+
+
+def get_backend():
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = os.environ.get("LLM_BACKEND", "gemini")
+            if name == "stub":
+                _backend = StubBackend(latency=float(os.environ.get("STUB_LATENCY", "0.5")))
+            elif name == "gemini":
+                _backend = GeminiBackend(api_key=os.environ.get("GEMINI_API_KEY"))
+            else:
+                raise ValueError(f"unknown LLM_BACKEND {name!r}")
+        return _backend
+
+
+def backend_for_key(api_key):
+    """Backend that makes every call with `api_key` (e.g. one a user typed in); the shared one if it needs no key."""
+    backend = get_backend()
+    if not api_key or not backend.requires_api_key or api_key == backend.api_key:
+        return backend
+    with _backend_lock:
+        keyed = _keyed.pop(api_key, None) or GeminiBackend(backend.model_name, api_key)
+        _keyed[api_key] = keyed
+        while len(_keyed) > MAX_KEYED_BACKENDS:
+            _keyed.popitem(last=False)
+        return keyed
+
+
+def set_backend(backend):
+    """Swap the process-wide backend (benchmarks, tests, headless tools)."""
+    global _backend
+    with _backend_lock:
+        _backend = backend
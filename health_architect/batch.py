@@ -0,0 +1,252 @@
+"""Headless cohort generation: python -m health_architect.batch profiles.csv -o plans.jsonl
+
+Profiles are read from CSV or JSONL with the columns age, bmi (or height/weight),
+activity, food, goal, budget, cuisine and an optional id. Profiles that also carry
+height, weight and sex get their macros from the local nutrition engine, computed for
+the whole cohort in one vectorized call. Plans are generated by an
+asyncio worker pool that shares a token-bucket rate limiter and backs off
+exponentially on 429s. Results stream to the output JSONL as they finish and a
+checkpoint file makes interrupted runs resumable.
+"""
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import sys
+import time
+
+from .backends import get_backend, is_quota_error
+from .cache import PlanCache, profile_key
+from .engine import generate_plan_internal
+from .metrics import metrics
+from .nutrition import ACTIVITY_FACTOR, GOAL_CALORIE_FACTOR, SEX_OFFSET, compute_macros_batch
+
+PROFILE_FIELDS = ("age", "bmi", "activity", "food", "goal", "budget", "cuisine")
+
+
+class TokenBucket:
+    """Async token bucket shared by all workers; a 429 pauses every worker, not just the one that hit it."""
+
+    def __init__(self, rate_per_minute, burst=1):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.blocked_until:
+                    await asyncio.sleep(self.blocked_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+    def pause(self, seconds):
+        self.blocked_until = max(self.blocked_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+def percentile(values, q):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def normalize_profile(raw):
+    """Validated profile dict; raises ValueError naming the bad or missing fields."""
+    profile = {k: raw.get(k) for k in PROFILE_FIELDS}
+    has_size = raw.get("height") not in (None, "") and raw.get("weight") not in (None, "")
+    missing = [k for k, v in profile.items() if v in (None, "") and not (k == "bmi" and has_size)]
+    if missing:
+        raise ValueError(f"profile missing {missing}: {raw}")
+    try:
+        if profile["bmi"] in (None, ""):
+            height, weight = float(raw["height"]), float(raw["weight"])
+            profile["bmi"] = round(weight / ((height / 100) ** 2), 2)
+        profile["age"], profile["bmi"] = int(float(profile["age"])), float(profile["bmi"])
+        for k in ("height", "weight", "sex"):
+            if raw.get(k) not in (None, ""):
+                profile[k] = float(raw[k]) if k != "sex" else raw[k]
+    except (TypeError, ValueError, ZeroDivisionError):
+        raise ValueError(f"age, bmi, height and weight must be numbers: {raw}") from None
+    # compute_macros_batch would otherwise fail the whole cohort on one unknown value.
+    for field, table in (("sex", SEX_OFFSET), ("activity", ACTIVITY_FACTOR), ("goal", GOAL_CALORIE_FACTOR)):
+        if field in profile and profile[field] not in table:
+            raise ValueError(f"unknown {field} {profile[field]!r}; expected one of {sorted(table)}")
+    profile["id"] = str(raw.get("id") or profile_key(*(profile[k] for k in PROFILE_FIELDS)))
+    return profile
+
+
+def attach_macros(profiles):
+    """Score every profile with height, weight and sex in a single NumPy call."""
+    scored = [p for p in profiles if all(k in p for k in ("height", "weight", "sex"))]
+    if not scored:
+        return
+    batch = compute_macros_batch(
+        [p["age"] for p in scored], [p["height"] for p in scored], [p["weight"] for p in scored],
+        [p["sex"] for p in scored], [p["activity"] for p in scored], [p["goal"] for p in scored],
+    )
+    for i, p in enumerate(scored):
+        p["macros"] = {k: int(batch[k][i]) for k in ("protein_grams", "carbs_grams", "fats_grams", "daily_calories")}
+
+
+def read_profiles(path, errors=None):
+    """Normalized profiles of a CSV/JSONL file; with an `errors` list, bad rows are skipped and
+    recorded there as (row number, message) instead of raising."""
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".csv"):
+            rows = list(csv.DictReader(f))
+        else:
+            rows = [line for line in f if line.strip()]
+    profiles = []
+    for i, row in enumerate(rows, 1):
+        try:
+            profiles.append(normalize_profile(row if isinstance(row, dict) else json.loads(row)))
+        except ValueError as e:
+            if errors is None:
+                raise
+            errors.append((i, str(e)))
+    attach_macros(profiles)
+    return profiles
+
+
+def read_checkpoint(path):
+    if not os.path.exists(path):
+        return set()
+    with open(path, encoding="utf-8") as f:
+        return {line.strip() for line in f if line.strip()}
+
+
+class BatchRunner:
+    def __init__(self, out_path, checkpoint_path, workers=4, rate_per_minute=10, max_attempts=5,
+                 backoff=2.0, max_backoff=60.0, cache=None, generate=generate_plan_internal):
+        self.out_path = out_path
+        self.checkpoint_path = checkpoint_path
+        self.workers = workers
+        self.bucket = TokenBucket(rate_per_minute, burst=workers)
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.cache = cache
+        self.generate = generate
+        self.latencies = []
+        self.counts = {"ok": 0, "failed": 0, "cached": 0, "skipped": 0, "retries": 0}
+
+    async def _generate(self, profile):
+        args = [profile[k] for k in PROFILE_FIELDS]
+        macros = profile.get("macros")
+        key = profile_key(*args, macros=macros)
+        if self.cache is not None:
+            plan, _ = self.cache.lookup(key)
+            if plan is not None:
+                self.counts["cached"] += 1
+                return plan, 0
+        for attempt in range(self.max_attempts):
+            await self.bucket.acquire()
+            started = time.perf_counter()
+            plan = await asyncio.to_thread(self.generate, *args, macros=macros)
+            if "error" not in plan:
+                if self.cache is not None:
+                    self.cache.put(key, plan, time.perf_counter() - started)
+                return plan, attempt
+            if not is_quota_error(plan["error"]) or attempt == self.max_attempts - 1:
+                return plan, attempt
+            self.counts["retries"] += 1
+            metrics.incr("batch_retries", profile=profile["id"])
+            delay = min(self.max_backoff, self.backoff * 2 ** attempt) * (1 + random.random() * 0.25)
+            self.bucket.pause(delay)
+            await asyncio.sleep(delay)
+
+    async def _worker(self, queue, out, checkpoint):
+        while True:
+            profile = await queue.get()
+            try:
+                started = time.perf_counter()
+                plan, retries = await self._generate(profile)
+                latency = time.perf_counter() - started
+                ok = "error" not in plan
+                record = {"id": profile["id"], "profile": profile, "latency_s": round(latency, 3), "retries": retries}
+                record.update({"plan": plan} if ok else plan)
+                out.write(json.dumps(record) + "\n")
+                out.flush()
+                if ok:
+                    checkpoint.write(profile["id"] + "\n")
+                    checkpoint.flush()
+                    self.latencies.append(latency)
+                self.counts["ok" if ok else "failed"] += 1
+            finally:
+                queue.task_done()
+
+    async def run(self, profiles):
+        done = read_checkpoint(self.checkpoint_path)
+        pending = [p for p in profiles if p["id"] not in done]
+        self.counts["skipped"] = len(profiles) - len(pending)
+        queue = asyncio.Queue()
+        for profile in pending:
+            queue.put_nowait(profile)
+
+        started = time.perf_counter()
+        with open(self.out_path, "a", encoding="utf-8") as out, open(self.checkpoint_path, "a", encoding="utf-8") as checkpoint:
+            tasks = [asyncio.create_task(self._worker(queue, out, checkpoint)) for _ in range(self.workers)]
+            await queue.join()
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed):
+        finished = self.counts["ok"] + self.counts["failed"]
+        return {
+            **self.counts,
+            "elapsed_s": round(elapsed, 2),
+            "plans_per_min": round(finished / elapsed * 60, 2) if elapsed else 0.0,
+            "p50_latency_s": round(percentile(self.latencies, 50), 3),
+            "p95_latency_s": round(percentile(self.latencies, 95), 3),
+        }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate plans for a cohort of profiles.")
+    parser.add_argument("profiles", help="CSV or JSONL file of profiles")
+    parser.add_argument("-o", "--out", default="plans.jsonl", help="JSONL file results are appended to")
+    parser.add_argument("--checkpoint", help="resume file (default: <out>.checkpoint)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--rpm", type=float, default=10, help="shared requests-per-minute budget")
+    parser.add_argument("--max-attempts", type=int, default=5)
+    parser.add_argument("--no-cache", action="store_true", help="skip the shared plan cache")
+    args = parser.parse_args(argv)
+
+    try:
+        backend = get_backend()  # LLM_BACKEND=stub runs the whole pipeline offline
+    except ValueError as e:
+        parser.error(str(e))
+    if backend.requires_api_key and not os.environ.get("GEMINI_API_KEY"):
+        parser.error(f"GEMINI_API_KEY is not set (needed by LLM_BACKEND={backend.name})")
+
+    runner = BatchRunner(
+        args.out, args.checkpoint or args.out + ".checkpoint", workers=args.workers, rate_per_minute=args.rpm,
+        max_attempts=args.max_attempts, cache=None if args.no_cache else PlanCache(),
+    )
+    errors = []
+    profiles = read_profiles(args.profiles, errors)
+    for row, message in errors:
+        print(f"skipping row {row}: {message}", file=sys.stderr)
+    report = asyncio.run(runner.run(profiles))
+    report["invalid"] = len(errors)
+    print(json.dumps(report, indent=2))
+    return 0 if report["failed"] == 0 and not errors else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,140 @@
+"""Two-tier plan cache: an in-process LRU in front of a SQLite tier shared across sessions."""
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from .engine import PROMPT_VERSION
+from .metrics import metrics
+
+DEFAULT_PATH = os.environ.get("PLAN_CACHE_PATH", os.path.join(".cache", "plan_cache.sqlite3"))
+BMI_BUCKET = 1.0  # BMI points per bucket; 22.1 and 22.9 share a plan
+
+
+def profile_key(age, bmi, activity, food, goal, budget, cuisine, macros=None, prompt_version=PROMPT_VERSION):
+    """Stable cache key for a profile; near-identical inputs map to the same key."""
+    profile = {
+        "age": int(age),
+        "bmi": round(math.floor(float(bmi) / BMI_BUCKET) * BMI_BUCKET, 1),
+        "activity": activity,
+        "food": food,
+        "goal": goal,
+        "budget": budget,
+        "cuisine": " ".join(str(cuisine).split()).casefold(),
+        "prompt_version": prompt_version,
+        # Locally computed targets are part of the prompt, so they are part of the key.
+        "macros": macros,
+    }
+    return hashlib.sha256(json.dumps(profile, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+class PlanCache:
+    def __init__(self, path=DEFAULT_PATH, memory_size=128, ttl_seconds=7 * 24 * 3600, max_entries=5000):
+        self.memory_size = memory_size
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._memory = OrderedDict()  # key -> (created_at, plan, gen_seconds)
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "saved_seconds": 0.0}
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS plan_cache ("
+            " key TEXT PRIMARY KEY, plan TEXT NOT NULL, created_at REAL NOT NULL,"
+            " accessed_at REAL NOT NULL, gen_seconds REAL NOT NULL DEFAULT 0)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS idx_plan_cache_accessed ON plan_cache(accessed_at)")
+        self._db.commit()
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _remember(self, key, created_at, plan, gen_seconds):
+        self._memory[key] = (created_at, plan, gen_seconds)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        return self.lookup(key)[0]
+
+    def lookup(self, key):
+        """Return (plan, source) with source "memory", "disk" or "miss" (plan is None on a miss)."""
+        plan, source = self._lookup(key)
+        metrics.incr(f"plan_cache_{source}")
+        return plan, source
+
+    def _lookup(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry and not self._expired(entry[0], now):
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                self.stats["saved_seconds"] += entry[2]
+                return entry[1], "memory"
+            self._memory.pop(key, None)
+
+            row = self._db.execute("SELECT plan, created_at, gen_seconds FROM plan_cache WHERE key = ?", (key,)).fetchone()
+            if row and not self._expired(row[1], now):
+                self._db.execute("UPDATE plan_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self._db.commit()
+                plan = json.loads(row[0])
+                self._remember(key, row[1], plan, row[2])
+                self.stats["disk_hits"] += 1
+                self.stats["saved_seconds"] += row[2]
+                return plan, "disk"
+            self.stats["misses"] += 1
+            return None, "miss"
+
+    def put(self, key, plan, gen_seconds=0.0):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, plan, gen_seconds)
+            self._db.execute(
+                "INSERT OR REPLACE INTO plan_cache (key, plan, created_at, accessed_at, gen_seconds) VALUES (?, ?, ?, ?, ?)",
+                (key, json.dumps(plan), now, now, gen_seconds),
+            )
+            self.stats["stores"] += 1
+            self._evict(now)
+            self._db.commit()
+
+    def _evict(self, now):
+        evicted = 0
+        if self.ttl_seconds is not None:
+            evicted += self._db.execute("DELETE FROM plan_cache WHERE created_at < ?", (now - self.ttl_seconds,)).rowcount
+        if self.max_entries is not None:
+            evicted += self._db.execute(
+                "DELETE FROM plan_cache WHERE key IN ("
+                " SELECT key FROM plan_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,),
+            ).rowcount
+        self.stats["evictions"] += evicted
+
+    def get_or_generate(self, key, generate):
+        """Return (plan, source) where source is "memory", "disk" or "miss"."""
+        plan, source = self.lookup(key)
+        if plan is not None:
+            return plan, source
+        started = time.perf_counter()
+        plan = generate()
+        if "error" not in plan:
+            self.put(key, plan, time.perf_counter() - started)
+        return plan, "miss"
+
+    def snapshot(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM plan_cache").fetchone()[0]
+        stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = round((stats["memory_hits"] + stats["disk_hits"]) / lookups, 3) if lookups else 0.0
+        stats["saved_seconds"] = round(stats["saved_seconds"], 2)
+        return stats
@@ -0,0 +1,140 @@
+"""Client for the plan HTTP API (server.py), used by the app when PLAN_API_URL is set.
+
+Only the standard library is used. Events come back in the same ("section" | "item"
+| "done" | "error", key, value) shape the in-process engines yield, so the app
+renders them with the same code.
+"""
+import json
+import threading
+import urllib.error
+import urllib.parse
+import urllib.request
+from collections import OrderedDict
+
+from .history import HistoryStore
+
+ENGINE_NAMES = {"Streaming": "stream", "Parallel Sections": "sections"}
+PDF_CACHE_SIZE = 16
+
+
+def _error_text(e):
+    try:
+        return json.loads(e.read())["error"]
+    except Exception:
+        return f"{e.code} {e.reason}"
+
+
+class PlanRequest:
+    """One streamed generation; plan_id and cache are set once the "done" event arrives."""
+
+    def __init__(self, client, payload):
+        self.client, self.payload = client, payload
+        self.plan_id = self.cache = None
+
+    def events(self):
+        try:
+            resp = self.client._open("/plans?stream=1", self.payload)
+        except urllib.error.HTTPError as e:
+            yield ("error", None, {"error": _error_text(e)})
+            return
+        except OSError as e:
+            yield ("error", None, {"error": f"Plan service unavailable: {e}"})
+            return
+        with resp:
+            for line in resp:
+                if not line.strip():
+                    continue
+                message = json.loads(line)
+                if message["event"] == "done":
+                    self.plan_id, self.cache = message["id"], message["cache"]
+                    yield ("done", None, message["plan"])
+                    return
+                if message["event"] == "error":
+                    yield ("error", None, {"error": message["error"]})
+                    return
+                yield (message["event"], message["key"], message["value"])
+        yield ("error", None, {"error": "Plan service closed the stream early."})
+
+
+class PlanClient:
+    def __init__(self, base_url, timeout=180.0):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self._pdfs = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _open(self, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode("utf-8")
+        headers = {"Content-Type": "application/json"} if data else {}
+        request = urllib.request.Request(self.base_url + path, data=data, headers=headers, method="POST" if data else "GET")
+        return urllib.request.urlopen(request, timeout=self.timeout)
+
+    def _get_json(self, path):
+        with self._open(path) as resp:
+            return json.loads(resp.read())
+
+    def generate(self, profile, session_id, user_id=None):
+        payload = {k: v for k, v in profile.items() if k != "engine"}
+        payload.update(engine=ENGINE_NAMES.get(profile.get("engine"), "stream"), session_id=session_id, user_id=user_id)
+        return PlanRequest(self, payload)
+
+    def get_plan(self, plan_id):
+        try:
+            return self._get_json(f"/plans/{plan_id}")
+        except urllib.error.HTTPError as e:
+            if e.code == 404:
+                return None
+            raise
+
+    def list_plans(self, session_id=None, limit=10, offset=0, user_id=None):
+        owner = {"user_id": user_id} if user_id is not None else {"session_id": session_id}
+        query = urllib.parse.urlencode({**owner, "limit": limit, "offset": offset})
+        return self._get_json(f"/plans?{query}")
+
+    def get_pdf(self, plan_id):
+        """PDF bytes for a stored plan; stored plans never change, so recent ones are kept."""
+        with self._lock:
+            if plan_id in self._pdfs:
+                self._pdfs.move_to_end(plan_id)
+                return self._pdfs[plan_id]
+        with self._open(f"/plans/{plan_id}/pdf") as resp:
+            pdf = resp.read()
+        with self._lock:
+            self._pdfs[plan_id] = pdf
+            while len(self._pdfs) > PDF_CACHE_SIZE:
+                self._pdfs.popitem(last=False)
+        return pdf
+
+
+class RemoteHistory(HistoryStore):
+    """Read side of HistoryStore backed by the API; plans are added by the server itself."""
+
+    def __init__(self, client):
+        self.client = client
+
+    def add(self, session_id, entry, goal=None, user_id=None):
+        raise NotImplementedError("the plan service stores plans when it generates them")
+
+    def count(self, session_id=None, user_id=None):
+        return self.client.list_plans(session_id, 1, user_id=user_id)["count"]
+
+    def page(self, session_id=None, limit=10, offset=0, user_id=None):
+        return self.client.list_plans(session_id, limit, offset, user_id)["items"]
+
+    def get(self, entry_id):
+        return self.client.get_plan(entry_id)
+
+    def iter_entries(self, session_id=None, batch_size=100, user_id=None):
+        if session_id is None and user_id is None:
+            raise NotImplementedError("the plan service only lists plans per user or session")
+        ids, offset = [], 0
+        while True:
+            items = self.page(session_id, batch_size, offset, user_id)
+            if not items:
+                break
+            ids.extend(item["id"] for item in items)
+            offset += len(items)
+        for entry_id in reversed(ids):  # pages are newest first
+            entry = self.get(entry_id)
+            if entry:
+                yield {"id": entry_id, "session_id": session_id, "goal": None, **entry}
@@ -0,0 +1,175 @@
+"""Gemini plan generation shared by the Streamlit app and headless tools.
+
+By default the model is asked for the compact columnar format in wire.py under a
+JSON response schema; set PLAN_WIRE_FORMAT=verbose to fall back to the keyed prompt.
+"""
+import json
+import os
+import time
+
+from . import wire
+from .backends import get_backend
+from .metrics import metrics, timed
+from .streaming import IncrementalPlanParser
+from .who import score_diet
+
+# Bump whenever the prompt or the expected JSON shape changes so cached plans are not reused.
+PROMPT_VERSION = "v4"
+COMPACT_OUTPUT = os.environ.get("PLAN_WIRE_FORMAT", "compact") == "compact"
+
+
+MACROS_SCHEMA = '''"macros": { "protein_grams": 0, "carbs_grams": 0, "fats_grams": 0, "daily_calories": 0 },'''
+
+
+def targets_text(macros):
+    """Prompt line that hands locally computed macros to the model as fixed inputs."""
+    return f"DAILY TARGETS (fixed, do not change): {json.dumps(macros)}" if macros else ""
+
+
+def build_prompt(age, bmi, activity, food, goal, budget, cuisine, macros=None):
+    return f"""
+    Act as a professional Nutritionist. Return ONLY valid JSON.
+    PROFILE: Age: {age}, BMI: {bmi}, Activity: {activity}, Diet: {food}, Goal: {goal}
+    CONSTRAINTS: Budget: {budget}, Cuisine: {cuisine}.
+    {targets_text(macros)}
+    JSON Structure:
+    {{
+      "overview": ["tip1", "tip2", "tip3"],
+      {"" if macros else MACROS_SCHEMA}
+      "diet": [ {{"day":"Mon", "breakfast":"...", "lunch":"...", "dinner":"..."}}, ... ],
+      "workout": [ {{"day":"Mon", "workout":"...", "duration":"...", "intensity":"..."}}, ... ]
+    }}
+    """
+
+
+def build_compact_prompt(age, bmi, activity, food, goal, budget, cuisine, macros=None):
+    return f"""
+    Act as a professional Nutritionist. Return ONLY valid JSON.
+    PROFILE: Age: {age}, BMI: {bmi}, Activity: {activity}, Diet: {food}, Goal: {goal}
+    CONSTRAINTS: Budget: {budget}, Cuisine: {cuisine}.
+    {targets_text(macros)}
+    {wire.format_instructions(include_macros=not macros)}
+    """
+
+
+def parse_plan(text):
+    clean_json = text.strip().replace("```json", "").replace("```", "")
+    return json.loads(clean_json)
+
+
+def _expected_sections(macros):
+    return [k for k in wire.PLAN_KEYS if k != wire.WHO and not (macros and k == wire.MACROS)]
+
+
+def _rerequest(invalid, profile, macros, backend):
+    """Fetch sections the compact response got wrong through the per-section prompts.
+
+    Returns (sections, total tokens the extra requests cost).
+    """
+    from .sections import _profile_text, core_prompt, diet_prompt, generate_section, workout_prompt
+
+    profile_text = _profile_text(*profile)
+    plan, usage = {}, {}
+    core_keys = tuple(wire.PLAN_KEYS[k] for k in invalid if k in (wire.OVERVIEW, wire.MACROS))
+    if core_keys:
+        plan.update(generate_section("core", core_prompt(profile_text, macros), core_keys, backend=backend, usage=usage))
+    macros = macros or plan.get("macros")
+    if wire.DIET in invalid:
+        plan.update(generate_section("diet", diet_prompt(profile_text, macros), ("diet",), backend=backend, usage=usage))
+    if wire.WORKOUT in invalid:
+        plan.update(generate_section("workout", workout_prompt(profile_text, macros), ("workout",), backend=backend, usage=usage))
+    spent = usage.get("total_tokens") or usage.get("prompt_tokens", 0) + usage.get("output_tokens", 0)
+    return plan, spent or wire.estimate_tokens(json.dumps(plan))
+
+
+def _decode_compact(compact, profile, macros, backend, usage, text):
+    """Repair and expand a compact response, re-requesting only the sections that failed.
+
+    Returns (plan, {plan_key: value} of re-requested sections).
+    """
+    with timed("wire_decode"):
+        fixed, invalid = wire.repair(compact, _expected_sections(macros))
+        plan = wire.decode(fixed)
+    refetched, spent = {}, 0
+    if invalid:
+        metrics.incr("wire_sections_rerequested", len(invalid), sections=",".join(invalid))
+        refetched, spent = _rerequest(invalid, profile, macros, backend)
+        plan.update(refetched)
+    savings = wire.token_savings(plan, text, usage.get("output_tokens"), spent)
+    metrics.incr("wire_tokens_saved", savings["saved_tokens"], **savings)
+    return plan, refetched
+
+
+def generate_plan_internal(age, bmi, activity, food, goal, budget, cuisine, macros=None, backend=None, compact=COMPACT_OUTPUT):
+    backend = backend or get_backend()
+    profile = (age, bmi, activity, food, goal, budget, cuisine)
+    if compact:
+        prompt, config = build_compact_prompt(*profile, macros), wire.generation_config(include_macros=not macros)
+    else:
+        prompt, config = build_prompt(*profile, macros), {}
+    try:
+        with timed("llm_generate", backend=backend.name):
+            res = backend.generate(prompt, **config)
+        metrics.record_usage(res.usage)
+        with timed("json_parse"):
+            plan = parse_plan(res.text)
+        if compact:
+            plan, _ = _decode_compact(plan, profile, macros, backend, res.usage, res.text)
+        if macros: plan["macros"] = macros
+        plan["who_analysis"] = score_diet(plan["diet"], plan.get("macros"))
+        return plan
+    except Exception as e:
+        metrics.incr("generation_errors", error=str(e)[:200])
+        return {"error": str(e)}
+
+
+def generate_plan_stream(age, bmi, activity, food, goal, budget, cuisine, macros=None, backend=None, compact=COMPACT_OUTPUT):
+    """Yield parser events while the response streams, then ("done", None, plan) or ("error", None, {"error": ...}).
+
+    Fixed macros are emitted before the model is even called. In compact mode rows
+    are expanded as they arrive; sections that fail validation are re-requested
+    after the stream ends and emitted then. who_analysis is always scored locally
+    once the diet is complete.
+    """
+    backend = backend or get_backend()
+    profile = (age, bmi, activity, food, goal, budget, cuisine)
+    if compact:
+        prompt, config = build_compact_prompt(*profile, macros), wire.generation_config(include_macros=not macros)
+        parser = IncrementalPlanParser(stream_arrays=(wire.DIET, wire.WORKOUT, "diet", "workout"))
+    else:
+        prompt, config = build_prompt(*profile, macros), {}
+        parser = IncrementalPlanParser()
+    if macros:
+        yield ("section", "macros", macros)
+    usage, started, first = {}, time.perf_counter(), None
+    try:
+        for chunk in backend.stream(prompt, usage=usage, **config):
+            if first is None:
+                first = time.perf_counter() - started
+                metrics.observe("llm_first_chunk", first, backend=backend.name)
+            for event in parser.feed(chunk):
+                if compact:
+                    event = wire.decode_event(event)
+                if event and event[1] != "who_analysis" and not (macros and event[1] == "macros"):
+                    yield event
+        # Includes time the caller spent rendering between chunks.
+        metrics.observe("llm_stream", time.perf_counter() - started, backend=backend.name)
+        metrics.record_usage(usage)
+        if parser.done:
+            plan = parser.sections
+        else:
+            with timed("json_parse", fallback=True):
+                plan = parse_plan(parser.text)
+        if compact:
+            plan, refetched = _decode_compact(plan, profile, macros, backend, usage, parser.text)
+            for key, value in refetched.items():
+                if not (macros and key == "macros"):
+                    yield ("section", key, value)
+        if macros: plan["macros"] = macros
+        plan["who_analysis"] = score_diet(plan["diet"], plan.get("macros"))
+        yield ("section", "who_analysis", plan["who_analysis"])
+    except Exception as e:
+        metrics.incr("generation_errors", error=str(e)[:200])
+        yield ("error", None, {"error": str(e)})
+        return
+    yield ("done", None, plan)
@@ -0,0 +1,174 @@
+"""Bulk export of the plan history: python -m health_architect.export diet.csv workout.parquet plans.zip
+
+Plans are streamed out of the history store in batches and flattened into one row
+per plan-day: a diet table (meals plus the plan's macros and WHO score) and a
+workout table. Each step is a generator, so memory stays flat however many plans
+are exported. CSV is written row by row, Parquet in fixed-size row groups (needs
+pyarrow), and PDF reports are rendered in parallel with a bounded window of in-flight
+plans and written to a ZIP in history order.
+"""
+import argparse
+import csv
+import io
+import multiprocessing
+import os
+import sys
+import zipfile
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from itertools import islice
+
+from .history import open_history
+from .report import render_pdf
+from .who import score_value
+
+PLAN_FIELDS = ("plan_id", "session_id", "date", "goal", "daily_calories", "protein_grams", "carbs_grams", "fats_grams")
+TABLES = {
+    "diet": PLAN_FIELDS + ("who_score", "day_index", "day", "breakfast", "lunch", "dinner"),
+    "workout": PLAN_FIELDS + ("day_index", "day", "workout", "duration", "intensity"),
+}
+INT_FIELDS = {"plan_id", "daily_calories", "protein_grams", "carbs_grams", "fats_grams", "day_index"}
+FLOAT_FIELDS = {"who_score"}
+ROW_GROUP_SIZE = 10_000
+PDF_WINDOW_PER_WORKER = 4
+
+
+def _number(value):
+    """Macros are ints in new plans but may be strings like "2200" in model-written ones."""
+    try:
+        return int(float(value))
+    except (TypeError, ValueError):
+        return None
+
+
+def plan_day_rows(entries, table):
+    """Flatten plans into one dict per day of `table` ("diet" or "workout")."""
+    fields = TABLES[table]
+    day_fields = fields[fields.index("day"):]
+    for entry in entries:
+        data = entry["data"]
+        macros = data.get("macros", {})
+        base = {"plan_id": entry["id"], "session_id": entry.get("session_id"), "date": entry["date"], "goal": entry.get("goal"),
+                **{k: _number(macros.get(k)) for k in PLAN_FIELDS[4:]}}
+        if table == "diet":
+            who = data.get("who_analysis", {})
+            base["who_score"] = who.get("value", score_value(who.get("score")))
+        for i, day in enumerate(data.get(table, [])):
+            row = dict(base, day_index=i, **{k: day.get(k) for k in day_fields})
+            yield {k: row.get(k) for k in fields}
+
+
+def iter_csv(rows, fields):
+    """CSV text chunks (header first), one per row, for files or streamed HTTP responses."""
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=fields)
+    writer.writeheader()
+    for row in rows:
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        writer.writerow(row)
+    yield buf.getvalue()
+
+
+def write_csv(rows, fields, out):
+    count = -1  # the header
+    for chunk in iter_csv(rows, fields):
+        out.write(chunk)
+        count += 1
+    return count
+
+
+def write_parquet(rows, fields, out, row_group_size=ROW_GROUP_SIZE):
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise RuntimeError("Parquet export needs pyarrow (pip install pyarrow)") from None
+
+    def arrow_type(field):
+        return pa.int64() if field in INT_FIELDS else pa.float64() if field in FLOAT_FIELDS else pa.string()
+
+    schema = pa.schema([(f, arrow_type(f)) for f in fields])
+    count = 0
+    with pq.ParquetWriter(out, schema) as writer:
+        while True:
+            batch = list(islice(rows, row_group_size))
+            if not batch:
+                break
+            writer.write_table(pa.Table.from_pylist(batch, schema=schema))
+            count += len(batch)
+    return count
+
+
+def _pdf_job(entry):
+    return f"plan_{entry['id']}_{entry['date']}.pdf", {"date": entry["date"], "data": entry["data"]}
+
+
+def write_pdf_zip(entries, out, workers=None, window=None, threads=False):
+    """Render every plan to a PDF inside a ZIP; at most `window` plans are in flight at once.
+
+    Renders on spawned processes (fork would copy the caller's threads and locks), or on
+    threads with threads=True for hosts like Streamlit whose __main__ must not be re-imported.
+    """
+    workers = workers or os.cpu_count() or 1
+    window = window or workers * PDF_WINDOW_PER_WORKER
+    count = 0
+    if threads:
+        pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="pdf-export")
+    else:
+        pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    with pool, zipfile.ZipFile(out, "w", zipfile.ZIP_DEFLATED) as zf:
+        pending = deque()
+        for entry in entries:
+            name, plan = _pdf_job(entry)
+            pending.append((name, pool.submit(render_pdf, plan)))
+            if len(pending) >= window:
+                name, future = pending.popleft()
+                zf.writestr(name, future.result())
+                count += 1
+        while pending:
+            name, future = pending.popleft()
+            zf.writestr(name, future.result())
+            count += 1
+    return count
+
+
+def export(history, path, session_id=None, workers=None, user_id=None):
+    """Write one export file, picking the format from the extension; returns the number of rows or PDFs."""
+    stem, ext = os.path.splitext(os.path.basename(path))
+    entries = history.iter_entries(session_id, user_id=user_id)
+    if ext == ".zip":
+        return write_pdf_zip(entries, path, workers)
+    table = stem if stem in TABLES else None
+    if table is None:
+        raise ValueError(f"cannot tell which table {path!r} holds; name it diet{ext} or workout{ext}")
+    rows = plan_day_rows(entries, table)
+    if ext == ".csv":
+        with open(path, "w", newline="", encoding="utf-8") as f:
+            return write_csv(rows, TABLES[table], f)
+    if ext == ".parquet":
+        return write_parquet(rows, TABLES[table], path)
+    raise ValueError(f"unsupported export format {ext!r}; use .csv, .parquet or .zip")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export stored plans as flat tables or a ZIP of PDF reports.")
+    parser.add_argument("outputs", nargs="+", help="diet.csv, workout.parquet, plans.zip, ...")
+    parser.add_argument("--session", help="only export plans from this session id")
+    parser.add_argument("--user", help="only export plans of this user id")
+    parser.add_argument("--workers", type=int, help="PDF render processes (default: all cores)")
+    args = parser.parse_args(argv)
+
+    history = open_history()
+    for path in args.outputs:
+        try:
+            count = export(history, path, args.session, args.workers, args.user)
+        except (ValueError, RuntimeError) as e:
+            parser.error(str(e))
+        print(f"{path}: {count} {'PDFs' if path.endswith('.zip') else 'rows'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,162 @@
+"""Offline food-composition database with a fuzzy dish-name matcher.
+
+The bundled table (datasets/foods.csv) lists nutrients per typical serving of
+common dishes, with regional names and spellings as aliases ("idly", "thayir
+sadam", "paruppu"). On first use it is compiled into a directory of .npy arrays
+that later loads memory-map: the nutrient matrix plus a hashed character-trigram
+inverted index (CSR offsets and postings) over every name and alias. Matching a
+dish is one bincount over the postings of its trigrams, ranked by Dice similarity,
+so misspellings and word order barely matter.
+"""
+import csv
+import hashlib
+import json
+import os
+import re
+import threading
+import zlib
+from functools import lru_cache
+
+import numpy as np
+
+DATASET_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "datasets", "foods.csv")
+DEFAULT_DIR = os.environ.get("FOOD_INDEX_DIR", os.path.join(".cache", "food_index"))
+NUTRIENTS = ("kcal", "protein_g", "carbs_g", "fat_g", "sat_fat_g", "fiber_g", "free_sugar_g", "sodium_mg", "produce_g")
+GRAM_BUCKETS = 4096
+MIN_SIMILARITY = 0.45
+MAX_SERVINGS = 6.0
+ARRAYS = ("nutrients", "serving_g", "alias_food", "alias_grams", "gram_offsets", "gram_postings")
+
+# Separators between dishes in one meal string; only the first of "x or y" alternatives is counted.
+_SPLIT = re.compile(r",|;|\+|&|\bwith\b|\band\b", re.I)
+_QTY = re.compile(r"(\d+(?:\.\d+)?)\s*(kg|g|gm|gms|grams?|ml)?\b", re.I)
+_FILLER = frozenset("a an the of bowl bowls cup cups plate glass small large medium piece pieces pcs pc "
+                    "serving servings slice slices tbsp tsp side some fresh homemade light".split())
+
+
+def normalize(text):
+    words = re.sub(r"[^a-z ]+", " ", str(text).casefold()).split()
+    return " ".join(w for w in words if w not in _FILLER)
+
+
+def trigram_ids(text):
+    padded = f" {text} "
+    return sorted({zlib.crc32(padded[i:i + 3].encode("utf-8")) % GRAM_BUCKETS for i in range(len(padded) - 2)})
+
+
+def parse_component(text):
+    """'2 chapati' -> ('chapati', 2.0, None); '200g paneer' -> ('paneer', None, 200.0)."""
+    count = grams = None
+    for m in _QTY.finditer(text):
+        value, unit = float(m.group(1)), (m.group(2) or "").casefold()
+        if unit:
+            grams = value * 1000 if unit == "kg" else value
+        elif count is None:
+            count = value
+    return normalize(text), count, grams
+
+
+def split_meal(meal):
+    return [part.split(" or ")[0] for part in _SPLIT.split(str(meal)) if part.strip()]
+
+
+def _digest(path):
+    with open(path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()[:16]
+
+
+def build_index(dataset=DATASET_PATH, path=DEFAULT_DIR, digest=None):
+    """Compile the CSV into the on-disk index; meta.json is written last and marks it complete."""
+    with open(dataset, encoding="utf-8", newline="") as f:
+        rows = list(csv.DictReader(f))
+    aliases, alias_food = [], []
+    for i, row in enumerate(rows):
+        for alias in dict.fromkeys([row["name"], *filter(None, row["aliases"].split("|"))]):
+            aliases.append(normalize(alias))
+            alias_food.append(i)
+    grams = [trigram_ids(a) for a in aliases]
+    buckets = [[] for _ in range(GRAM_BUCKETS)]
+    for alias_id, ids in enumerate(grams):
+        for g in ids:
+            buckets[g].append(alias_id)
+    arrays = {
+        "nutrients": np.array([[float(row[k]) for k in NUTRIENTS] for row in rows], dtype=np.float32),
+        "serving_g": np.array([float(row["serving_g"]) for row in rows], dtype=np.float32),
+        "alias_food": np.array(alias_food, dtype=np.int32),
+        "alias_grams": np.array([len(g) for g in grams], dtype=np.int32),
+        "gram_offsets": np.concatenate([[0], np.cumsum([len(b) for b in buckets])]).astype(np.int32),
+        "gram_postings": np.array([a for b in buckets for a in b], dtype=np.int32),
+    }
+    os.makedirs(path, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(os.path.join(path, f"{name}.npy"), array)
+    meta = {"digest": digest or _digest(dataset), "names": [row["name"] for row in rows], "aliases": aliases}
+    tmp = os.path.join(path, "meta.json.tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(tmp, os.path.join(path, "meta.json"))
+    return meta
+
+
+class FoodDatabase:
+    def __init__(self, path=DEFAULT_DIR, dataset=DATASET_PATH):
+        digest = _digest(dataset)
+        meta_path = os.path.join(path, "meta.json")
+        meta = None
+        if os.path.exists(meta_path):
+            with open(meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        if meta is None or meta.get("digest") != digest:
+            meta = build_index(dataset, path, digest)
+        self.names, self.aliases = meta["names"], meta["aliases"]
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r"))
+        self.match = lru_cache(maxsize=4096)(self._match)
+
+    def __len__(self):
+        return len(self.names)
+
+    def _match(self, text):
+        """(food row, similarity) of the best name or alias for normalized `text`, or (None, best similarity)."""
+        query = trigram_ids(text) if text else []
+        if not query:
+            return None, 0.0
+        offsets = self.gram_offsets
+        hits = np.concatenate([self.gram_postings[offsets[g]:offsets[g + 1]] for g in query])
+        if not len(hits):
+            return None, 0.0
+        overlap = np.bincount(hits, minlength=len(self.alias_food))
+        dice = 2 * overlap / (len(query) + self.alias_grams)
+        best = int(np.argmax(dice))
+        if dice[best] < MIN_SIMILARITY:
+            return None, float(dice[best])
+        return int(self.alias_food[best]), float(dice[best])
+
+    def estimate_meal(self, meal):
+        """Nutrient vector (NUTRIENTS order) for a free-text meal, plus the matched and unmatched dishes."""
+        total = np.zeros(len(NUTRIENTS), dtype=np.float64)
+        matched, unmatched = [], []
+        for part in split_meal(meal):
+            text, count, grams = parse_component(part)
+            food, _ = self.match(text)
+            if food is None:
+                if text:
+                    unmatched.append(part.strip())
+                continue
+            servings = grams / float(self.serving_g[food]) if grams else (count or 1.0)
+            total += self.nutrients[food] * min(servings, MAX_SERVINGS)
+            matched.append(self.names[food])
+        return total, matched, unmatched
+
+
+_db = None
+_db_lock = threading.Lock()
+
+
+def food_database():
+    """Process-wide database, built or memory-mapped on first use."""
+    global _db
+    with _db_lock:
+        if _db is None:
+            _db = FoodDatabase()
+        return _db
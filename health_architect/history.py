@@ -0,0 +1,191 @@
+"""Plan history backends. SQLite is the default; pick another with HISTORY_BACKEND."""
+import json
+import os
+import sqlite3
+import threading
+import time
+
+DEFAULT_PATH = os.environ.get("HISTORY_DB_PATH", os.path.join("data", "history.sqlite3"))
+
+
+def _summary(entry_id, date, goal, macros):
+    return {"id": entry_id, "date": date, "goal": goal, "macros": macros}
+
+
+class HistoryStore:
+    """Interface every history backend implements.
+
+    Listing returns light summaries (id, date, goal, macros); the full plan body is
+    only loaded through get() so the History page can fetch it on demand. Plans are
+    listed by user_id when one is given (it outlives browser sessions and restarts),
+    otherwise by session_id. Weeks of a multi-week program (see program.py) are kept
+    separately, keyed by program id.
+    """
+
+    def add(self, session_id, entry, goal=None, user_id=None):
+        raise NotImplementedError
+
+    def count(self, session_id=None, user_id=None):
+        raise NotImplementedError
+
+    def page(self, session_id=None, limit=10, offset=0, user_id=None):
+        raise NotImplementedError
+
+    def get(self, entry_id):
+        raise NotImplementedError
+
+    def iter_entries(self, session_id=None, batch_size=200, user_id=None):
+        """Yield every stored plan ({"id", "session_id", "date", "goal", "data"}) oldest first.
+
+        Rows are read batch_size at a time so exports never hold the whole store. With
+        neither session_id nor user_id, every plan in the store is yielded.
+        """
+        raise NotImplementedError
+
+    def save_week(self, program_id, week, plan):
+        raise NotImplementedError
+
+    def get_week(self, program_id, week):
+        raise NotImplementedError
+
+    def latest_week(self, program_id):
+        """Highest stored week of the program (0 when it has none)."""
+        raise NotImplementedError
+
+
+class MemoryHistory(HistoryStore):
+    """Process-local backend for development; lost on restart."""
+
+    def __init__(self):
+        self._rows = []
+        self._weeks = {}  # (program_id, week) -> plan
+        self._lock = threading.Lock()
+
+    def add(self, session_id, entry, goal=None, user_id=None):
+        with self._lock:
+            self._rows.append({"session_id": session_id, "user_id": user_id, "goal": goal, "entry": entry})
+            return len(self._rows)
+
+    def _owned_rows(self, session_id, user_id):
+        key, value = ("user_id", user_id) if user_id is not None else ("session_id", session_id)
+        return [(i + 1, r) for i, r in enumerate(list(self._rows)) if value is None or r[key] == value]
+
+    def count(self, session_id=None, user_id=None):
+        return len(self._owned_rows(session_id, user_id))
+
+    def page(self, session_id=None, limit=10, offset=0, user_id=None):
+        rows = list(reversed(self._owned_rows(session_id, user_id)))[offset:offset + limit]
+        return [_summary(i, r["entry"]["date"], r["goal"], r["entry"]["data"]["macros"]) for i, r in rows]
+
+    def get(self, entry_id):
+        return self._rows[entry_id - 1]["entry"] if 0 < entry_id <= len(self._rows) else None
+
+    def iter_entries(self, session_id=None, batch_size=200, user_id=None):
+        for i, r in self._owned_rows(session_id, user_id):
+            yield {"id": i, "session_id": r["session_id"], "date": r["entry"]["date"], "goal": r["goal"], "data": r["entry"]["data"]}
+
+    def save_week(self, program_id, week, plan):
+        with self._lock:
+            self._weeks[(program_id, week)] = plan
+
+    def get_week(self, program_id, week):
+        return self._weeks.get((program_id, week))
+
+    def latest_week(self, program_id):
+        with self._lock:
+            return max((w for p, w in self._weeks if p == program_id), default=0)
+
+
+class SQLiteHistory(HistoryStore):
+    def __init__(self, path=DEFAULT_PATH):
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(
+            "CREATE TABLE IF NOT EXISTS plans ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL, user_id TEXT,"
+            " created_at REAL NOT NULL, date TEXT NOT NULL, goal TEXT, macros TEXT NOT NULL, body TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS idx_plans_session ON plans(session_id, created_at);"
+            "CREATE INDEX IF NOT EXISTS idx_plans_user ON plans(user_id, created_at);"
+            "CREATE INDEX IF NOT EXISTS idx_plans_date ON plans(date);"
+            "CREATE INDEX IF NOT EXISTS idx_plans_goal ON plans(goal, date);"
+            "CREATE TABLE IF NOT EXISTS program_weeks ("
+            " program_id TEXT NOT NULL, week INTEGER NOT NULL, created_at REAL NOT NULL, body TEXT NOT NULL,"
+            " PRIMARY KEY (program_id, week));"
+        )
+
+    def add(self, session_id, entry, goal=None, user_id=None):
+        with self._lock:
+            cur = self._db.execute(
+                "INSERT INTO plans (session_id, user_id, created_at, date, goal, macros, body) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (session_id, user_id, time.time(), entry["date"], goal, json.dumps(entry["data"].get("macros", {})), json.dumps(entry["data"])),
+            )
+            self._db.commit()
+            return cur.lastrowid
+
+    @staticmethod
+    def _owner(session_id, user_id):
+        """WHERE clause and parameters selecting one user's (or session's) plans."""
+        if user_id is not None:
+            return "user_id = ?", (user_id,)
+        return "session_id = ?", (session_id,)
+
+    def count(self, session_id=None, user_id=None):
+        where, params = self._owner(session_id, user_id)
+        with self._lock:
+            return self._db.execute(f"SELECT COUNT(*) FROM plans WHERE {where}", params).fetchone()[0]
+
+    def page(self, session_id=None, limit=10, offset=0, user_id=None):
+        where, params = self._owner(session_id, user_id)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT id, date, goal, macros FROM plans WHERE {where} ORDER BY created_at DESC, id DESC LIMIT ? OFFSET ?",
+                (*params, limit, offset),
+            ).fetchall()
+        return [_summary(i, date, goal, json.loads(macros)) for i, date, goal, macros in rows]
+
+    def get(self, entry_id):
+        with self._lock:
+            row = self._db.execute("SELECT date, body FROM plans WHERE id = ?", (entry_id,)).fetchone()
+        return {"date": row[0], "data": json.loads(row[1])} if row else None
+
+    def iter_entries(self, session_id=None, batch_size=200, user_id=None):
+        where, params = self._owner(session_id, user_id) if (session_id, user_id) != (None, None) else ("1", ())
+        last = 0
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT id, session_id, date, goal, body FROM plans WHERE id > ? AND {where} ORDER BY id LIMIT ?",
+                    (last, *params, batch_size),
+                ).fetchall()
+            if not rows:
+                return
+            for entry_id, sid, date, goal, body in rows:
+                yield {"id": entry_id, "session_id": sid, "date": date, "goal": goal, "data": json.loads(body)}
+            last = rows[-1][0]
+
+    def save_week(self, program_id, week, plan):
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO program_weeks (program_id, week, created_at, body) VALUES (?, ?, ?, ?)",
+                (program_id, week, time.time(), json.dumps(plan)),
+            )
+            self._db.commit()
+
+    def get_week(self, program_id, week):
+        with self._lock:
+            row = self._db.execute("SELECT body FROM program_weeks WHERE program_id = ? AND week = ?", (program_id, week)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def latest_week(self, program_id):
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(MAX(week), 0) FROM program_weeks WHERE program_id = ?", (program_id,)).fetchone()[0]
+
+
+BACKENDS = {"sqlite": SQLiteHistory, "memory": MemoryHistory}
+
+
+def open_history(backend=None, **kwargs):
+    return BACKENDS[backend or os.environ.get("HISTORY_BACKEND", "sqlite")](**kwargs)
@@ -0,0 +1,145 @@
+"""Lightweight stage timings and counters for the plan pipeline.
+
+Every observation is appended to a rotating JSONL log and aggregated into
+Prometheus-style histograms/counters (render_prometheus / write_prometheus). A
+bounded window of recent samples per stage feeds the admin performance panel.
+"""
+import contextvars
+import json
+import logging
+import math
+import os
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from logging.handlers import RotatingFileHandler
+
+LOG_PATH = os.environ.get("METRICS_LOG_PATH", os.path.join(".cache", "metrics.jsonl"))
+PROM_PATH = os.environ.get("METRICS_PROM_PATH", os.path.join(".cache", "metrics.prom"))
+BUCKETS_SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, math.inf)
+RECENT_SAMPLES = 200
+
+# Set by collect_usage(); every record_usage() in that context appends its total tokens.
+_usage_sink = contextvars.ContextVar("usage_sink", default=None)
+
+
+@contextmanager
+def collect_usage():
+    """Collect the token totals recorded while the block runs, including in threads started
+    with a copy of this context (contextvars.copy_context().run)."""
+    sink = []
+    token = _usage_sink.set(sink)
+    try:
+        yield sink
+    finally:
+        _usage_sink.reset(token)
+
+
+class Metrics:
+    def __init__(self, log_path=LOG_PATH, prom_path=PROM_PATH, recent=RECENT_SAMPLES):
+        self.log_path, self.prom_path = log_path, prom_path
+        self.counters = defaultdict(float)
+        self.gauges = {}
+        self.histograms = {}  # stage -> {"buckets": [...], "sum": s, "count": n}
+        self.recent = defaultdict(lambda: deque(maxlen=recent))
+        self._lock = threading.Lock()
+        self._logger = None
+
+    def _log(self, record):
+        if not self.log_path:
+            return
+        if self._logger is None:
+            if os.path.dirname(self.log_path):
+                os.makedirs(os.path.dirname(self.log_path), exist_ok=True)
+            logger = logging.getLogger(f"health_architect.metrics.{id(self)}")
+            logger.propagate = False
+            logger.setLevel(logging.INFO)
+            handler = RotatingFileHandler(self.log_path, maxBytes=5 * 2**20, backupCount=3, encoding="utf-8")
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            logger.addHandler(handler)
+            self._logger = logger
+        self._logger.info(json.dumps({"ts": round(time.time(), 3), **record}, default=str))
+
+    def observe(self, stage, seconds, **fields):
+        with self._lock:
+            hist = self.histograms.setdefault(stage, {"buckets": [0] * len(BUCKETS_SECONDS), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(BUCKETS_SECONDS):
+                if seconds <= bound:
+                    hist["buckets"][i] += 1
+                    break
+            hist["sum"] += seconds
+            hist["count"] += 1
+            self.recent[stage].append(seconds)
+        self._log({"stage": stage, "seconds": round(seconds, 6), **fields})
+
+    def incr(self, name, value=1, **fields):
+        with self._lock:
+            self.counters[name] += value
+        if fields:
+            self._log({"counter": name, "value": value, **fields})
+
+    def set_gauge(self, name, value):
+        with self._lock:
+            self.gauges[name] = value
+
+    def record_usage(self, usage, stage="llm"):
+        """Accumulate token counts from a backend response's usage dict."""
+        for key in ("prompt_tokens", "output_tokens", "total_tokens"):
+            if usage.get(key):
+                self.incr(f"{stage}_{key}", usage[key])
+        sink = _usage_sink.get()
+        if sink is not None:
+            sink.append(usage.get("total_tokens") or usage.get("prompt_tokens", 0) + usage.get("output_tokens", 0))
+
+    @contextmanager
+    def timer(self, stage, **fields):
+        started = time.perf_counter()
+        try:
+            yield fields
+        except Exception as e:
+            fields["error"] = type(e).__name__
+            raise
+        finally:
+            self.observe(stage, time.perf_counter() - started, **fields)
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "stages": {stage: {"count": h["count"], "sum": h["sum"], "recent": list(self.recent[stage])}
+                           for stage, h in self.histograms.items()},
+            }
+
+    def render_prometheus(self, prefix="health_architect"):
+        lines = []
+        with self._lock:
+            for name, value in sorted(self.counters.items()):
+                lines += [f"# TYPE {prefix}_{name}_total counter", f"{prefix}_{name}_total {value:g}"]
+            for name, value in sorted(self.gauges.items()):
+                lines += [f"# TYPE {prefix}_{name} gauge", f"{prefix}_{name} {value:g}"]
+            if self.histograms:
+                lines.append(f"# TYPE {prefix}_stage_seconds histogram")
+            for stage, hist in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, count in zip(BUCKETS_SECONDS, hist["buckets"]):
+                    cumulative += count
+                    le = "+Inf" if bound == math.inf else f"{bound:g}"
+                    lines.append(f'{prefix}_stage_seconds_bucket{{stage="{stage}",le="{le}"}} {cumulative}')
+                lines.append(f'{prefix}_stage_seconds_sum{{stage="{stage}"}} {hist["sum"]:.6f}')
+                lines.append(f'{prefix}_stage_seconds_count{{stage="{stage}"}} {hist["count"]}')
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path=None):
+        path = path or self.prom_path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"  # sessions write from concurrent script threads
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(self.render_prometheus())
+        os.replace(tmp, path)
+
+
+metrics = Metrics()
+timed = metrics.timer
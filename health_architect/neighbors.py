@@ -0,0 +1,194 @@
+"""Nearest-neighbour index over previously generated plans.
+
+Each profile becomes a small numeric vector (scaled age and BMI, one-hot activity,
+diet type and goal, ordinal budget) plus a hashed character-trigram embedding of the
+cuisine text, so "South Indian" and "south-indian" land next to each other. Search
+is a single NumPy distance computation over the whole matrix.
+
+Persistence is append-only: vectors go to a raw float32 file and plans to a JSONL
+sidecar, so inserts never rewrite what is already on disk. The app and the API
+servers share the directory, so each paired append (and the load) holds an
+exclusive lock on a lock file there, keeping row i of both files the same plan.
+Each plan line records its row number; before every append the files are cut
+back to the rows present in both, so a write torn by a crash (a partial line or
+an orphan vector) is dropped instead of shifting every later pair.
+"""
+import json
+import os
+import threading
+import zlib
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:  # Windows: no cross-process lock, one writer per index directory
+    fcntl = None
+
+DEFAULT_DIR = os.environ.get("PLAN_INDEX_DIR", os.path.join(".cache", "plan_index"))
+ACTIVITIES = ("Sedentary", "Moderate", "Active")
+DIETS = ("Vegetarian", "Non-Vegetarian", "Vegan")
+GOALS = ("Weight Loss", "Muscle Gain", "Maintenance")
+BUDGETS = ("Student (Low Cost)", "Standard", "Premium")
+CUISINE_DIMS = 32
+# Relative importance of each block; diet type and goal change a plan far more than a year of age.
+WEIGHTS = {"age": 1.0, "bmi": 1.5, "activity": 1.0, "diet": 3.0, "goal": 3.0, "budget": 1.0, "cuisine": 2.0}
+FEATURE_DIMS = 2 + len(ACTIVITIES) + len(DIETS) + len(GOALS) + 1 + CUISINE_DIMS
+ROW_BYTES = FEATURE_DIMS * np.dtype(np.float32).itemsize
+TAIL_CHUNK = 64 * 1024
+NEAR_MATCH_DISTANCE = 1.0  # squared distance under which a stored plan is worth showing
+
+
+def _one_hot(value, options, weight):
+    vec = np.zeros(len(options), dtype=np.float32)
+    if value in options:
+        vec[options.index(value)] = weight
+    return vec
+
+
+def cuisine_vector(text):
+    """Hashed character-trigram embedding (L2-normalized) of a free-text cuisine."""
+    text = f"  {' '.join(str(text).casefold().replace('-', ' ').split())}  "
+    vec = np.zeros(CUISINE_DIMS, dtype=np.float32)
+    for i in range(len(text) - 2):
+        vec[zlib.crc32(text[i:i + 3].encode("utf-8")) % CUISINE_DIMS] += 1
+    norm = np.linalg.norm(vec)
+    return vec / norm if norm else vec
+
+
+@contextmanager
+def _file_lock(path):
+    with open(path, "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def featurize(profile):
+    w = WEIGHTS
+    budget = BUDGETS.index(profile["budget"]) / (len(BUDGETS) - 1) if profile["budget"] in BUDGETS else 0.5
+    return np.concatenate([
+        np.array([float(profile["age"]) / 10 * w["age"], float(profile["bmi"]) / 5 * w["bmi"]], dtype=np.float32),
+        _one_hot(profile["activity"], ACTIVITIES, w["activity"]),
+        _one_hot(profile["food"], DIETS, w["diet"]),
+        _one_hot(profile["goal"], GOALS, w["goal"]),
+        np.array([budget * w["budget"]], dtype=np.float32),
+        cuisine_vector(profile["cuisine"]) * w["cuisine"],
+    ])
+
+
+class PlanIndex:
+    def __init__(self, path=DEFAULT_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+        self._vectors_path = os.path.join(path, "vectors.f32")
+        self._plans_path = os.path.join(path, "plans.jsonl")
+        self._lock_path = os.path.join(path, ".lock")
+        self._lock = threading.Lock()
+        with _file_lock(self._lock_path):
+            plans = self._scan_plans()
+            n = self._truncate(len(plans), [end for _, end in plans])
+            vectors = np.fromfile(self._vectors_path, dtype=np.float32) if os.path.exists(self._vectors_path) else np.empty(0, np.float32)
+        self._payloads = [payload for payload, _ in plans[:n]]
+        self._size = n
+        self._matrix = np.zeros((max(64, n * 2), FEATURE_DIMS), dtype=np.float32)
+        self._matrix[:n] = vectors[:n * FEATURE_DIMS].reshape(n, FEATURE_DIMS)
+        self._diets = [p["profile"]["food"] for p in self._payloads]
+
+    def __len__(self):
+        return self._size
+
+    def _scan_plans(self):
+        """Every parsable plan line as (payload, end offset), up to the first torn or corrupt one."""
+        plans, offset = [], 0
+        if os.path.exists(self._plans_path):
+            with open(self._plans_path, "rb") as f:
+                for line in f:
+                    try:
+                        payload = json.loads(line)
+                    except ValueError:
+                        break
+                    if not line.endswith(b"\n"):
+                        break
+                    offset += len(line)
+                    plans.append((payload, offset))
+        return plans
+
+    def _tail_rows(self):
+        """Plan rows on disk from the row number of the last line, or None if it has to be scanned."""
+        size = os.path.getsize(self._plans_path) if os.path.exists(self._plans_path) else 0
+        if not size:
+            return 0
+        with open(self._plans_path, "rb") as f:
+            f.seek(max(0, size - TAIL_CHUNK))
+            lines = f.read().split(b"\n")
+        if len(lines) < 3 or lines[-1]:  # a line longer than the chunk, or a partial last line
+            return None
+        try:
+            return json.loads(lines[-2])["row"] + 1
+        except (ValueError, KeyError, TypeError):
+            return None
+
+    def _truncate(self, rows, ends=None):
+        """Cut both files back to the rows present in both (call under the file lock); returns that count."""
+        vector_size = os.path.getsize(self._vectors_path) if os.path.exists(self._vectors_path) else 0
+        n = min(rows, vector_size // ROW_BYTES)
+        if vector_size > n * ROW_BYTES:
+            os.truncate(self._vectors_path, n * ROW_BYTES)
+        plans_size = os.path.getsize(self._plans_path) if os.path.exists(self._plans_path) else 0
+        if ends is None and n < rows:
+            ends = [end for _, end in self._scan_plans()]
+        keep = plans_size if ends is None else ends[n - 1] if n else 0
+        if plans_size > keep:
+            os.truncate(self._plans_path, keep)
+        return n
+
+    def add(self, profile, plan):
+        vec = featurize(profile)
+        payload = {"profile": {k: profile[k] for k in ("age", "bmi", "activity", "food", "goal", "budget", "cuisine")}, "plan": plan}
+        with self._lock:
+            if self._size == len(self._matrix):
+                grown = np.zeros((len(self._matrix) * 2, FEATURE_DIMS), dtype=np.float32)
+                grown[:self._size] = self._matrix[:self._size]
+                self._matrix = grown
+            self._matrix[self._size] = vec
+            self._payloads.append(payload)
+            self._diets.append(profile["food"])
+            self._size += 1
+            with _file_lock(self._lock_path):
+                rows = self._tail_rows()
+                if rows is None:
+                    plans = self._scan_plans()
+                    row = self._truncate(len(plans), [end for _, end in plans])
+                else:
+                    row = self._truncate(rows)
+                with open(self._vectors_path, "ab") as f:
+                    vec.tofile(f)
+                with open(self._plans_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps({**payload, "row": row}) + "\n")
+            return self._size - 1
+
+    def search(self, profile, k=1, same_diet=True, max_distance=None):
+        """Return up to k (distance, payload) pairs, closest first.
+
+        same_diet keeps a vegan user from ever being shown a non-vegan plan.
+        """
+        query = featurize(profile)
+        with self._lock:
+            n = self._size
+            if not n:
+                return []
+            matrix = self._matrix[:n]
+            dist = np.einsum("ij,ij->i", matrix, matrix) - 2 * matrix @ query + query @ query
+            if same_diet:
+                dist = np.where(np.asarray(self._diets[:n]) == profile["food"], dist, np.inf)
+            order = np.argsort(dist)[:k] if k < n else np.argsort(dist)
+            hits = [(float(dist[i]), self._payloads[i]) for i in order if np.isfinite(dist[i])]
+        if max_distance is not None:
+            hits = [h for h in hits if h[0] <= max_distance]
+        return hits
@@ -0,0 +1,69 @@
+"""Deterministic calorie and macro targets (Mifflin-St Jeor + goal adjustment), vectorized with NumPy.
+
+compute_macros_batch() scores a whole cohort in one call; compute_macros() is the
+single-profile wrapper that returns the same "macros" dict the plan JSON uses.
+
+Protein is dosed per kg of adjusted body weight (reference weight at BMI 25 plus 40%
+of any excess) and capped at 35% of energy, so it does not scale with fat mass. Carbs
+never drop below the 130 g/day RDA: the shortfall comes out of fat (down to 20% of
+energy), then protein.
+"""
+import numpy as np
+
+SEX_OFFSET = {"Male": 5.0, "Female": -161.0}
+ACTIVITY_FACTOR = {"Sedentary": 1.2, "Moderate": 1.55, "Active": 1.725}
+GOAL_CALORIE_FACTOR = {"Weight Loss": 0.80, "Muscle Gain": 1.10, "Maintenance": 1.0}
+PROTEIN_G_PER_KG = {"Weight Loss": 2.0, "Muscle Gain": 1.8, "Maintenance": 1.6}
+FAT_ENERGY_SHARE = 0.25
+MIN_FAT_ENERGY_SHARE = 0.20
+MAX_PROTEIN_ENERGY_SHARE = 0.35
+REFERENCE_BMI = 25.0
+ADJUSTED_WEIGHT_EXCESS_SHARE = 0.4
+MIN_CARBS_G = 130
+MIN_DAILY_CALORIES = 1200
+KCAL_PER_G = {"protein": 4, "carbs": 4, "fats": 9}
+
+
+def _lookup(table, values, name):
+    try:
+        return np.fromiter((table[v] for v in values), dtype=float, count=len(values))
+    except KeyError as e:
+        raise ValueError(f"unknown {name} {e.args[0]!r}; expected one of {sorted(table)}") from None
+
+
+def compute_macros_batch(age, height_cm, weight_kg, sex, activity, goal):
+    """Arrays in, arrays out: bmr, tdee, daily_calories, protein_grams, carbs_grams, fats_grams."""
+    age = np.asarray(age, dtype=float)
+    height_cm = np.asarray(height_cm, dtype=float)
+    weight_kg = np.asarray(weight_kg, dtype=float)
+    sex, activity, goal = list(sex), list(activity), list(goal)
+
+    bmr = 10 * weight_kg + 6.25 * height_cm - 5 * age + _lookup(SEX_OFFSET, sex, "sex")
+    tdee = bmr * _lookup(ACTIVITY_FACTOR, activity, "activity")
+    calories = np.maximum(tdee * _lookup(GOAL_CALORIE_FACTOR, goal, "goal"), MIN_DAILY_CALORIES)
+    reference_kg = REFERENCE_BMI * (height_cm / 100) ** 2
+    adjusted_kg = np.where(weight_kg > reference_kg, reference_kg + ADJUSTED_WEIGHT_EXCESS_SHARE * (weight_kg - reference_kg), weight_kg)
+    protein_kcal = np.minimum(adjusted_kg * _lookup(PROTEIN_G_PER_KG, goal, "goal") * KCAL_PER_G["protein"],
+                              calories * MAX_PROTEIN_ENERGY_SHARE)
+    fat_kcal = calories * FAT_ENERGY_SHARE
+    shortfall = np.maximum(MIN_CARBS_G * KCAL_PER_G["carbs"] - (calories - protein_kcal - fat_kcal), 0)
+    fat_cut = np.minimum(shortfall, fat_kcal - calories * MIN_FAT_ENERGY_SHARE)
+    fat_kcal -= fat_cut
+    protein_kcal -= shortfall - fat_cut
+    protein = protein_kcal / KCAL_PER_G["protein"]
+    fats = fat_kcal / KCAL_PER_G["fats"]
+    carbs = (calories - protein_kcal - fat_kcal) / KCAL_PER_G["carbs"]
+
+    return {
+        "bmr": np.rint(bmr).astype(int),
+        "tdee": np.rint(tdee).astype(int),
+        "daily_calories": np.rint(calories).astype(int),
+        "protein_grams": np.rint(protein).astype(int),
+        "carbs_grams": np.rint(carbs).astype(int),
+        "fats_grams": np.rint(fats).astype(int),
+    }
+
+
+def compute_macros(age, height_cm, weight_kg, sex, activity, goal):
+    batch = compute_macros_batch([age], [height_cm], [weight_kg], [sex], [activity], [goal])
+    return {k: int(batch[k][0]) for k in ("protein_grams", "carbs_grams", "fats_grams", "daily_calories")}
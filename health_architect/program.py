@@ -0,0 +1,126 @@
+"""12-week programs generated one week at a time.
+
+Week 1 is the regular generated plan. Each later week is requested as a delta
+against the stored previous week: the model sees last week's rows in the compact
+wire format, returns only the days it progresses, and every other row is carried
+over unchanged. Weeks are built lazily (when first viewed, or prefetched after a
+check-in) and run through the shared scheduler, so they count against the same
+quota. Each week is its own scheduler job keyed by its number, so a week requested
+twice, directly or as the base of a later week, is only generated once.
+"""
+import uuid
+
+from . import wire
+from .backends import get_backend
+from .engine import parse_plan, targets_text
+from .metrics import metrics, timed
+from .who import score_diet
+
+PROGRAM_WEEKS = 12
+PREFETCH_AHEAD = 1
+MAX_CHANGED_DAYS = 3
+
+
+def delta_prompt(profile, macros, week, previous):
+    last = wire.encode({k: previous[k] for k in ("diet", "workout")})
+    return f"""
+    Act as a professional Nutritionist and Fitness Coach. Return ONLY valid JSON.
+    PROFILE: Age: {profile['age']}, BMI: {profile['bmi']}, Activity: {profile['activity']}, Diet: {profile['food']}, Goal: {profile['goal']}
+    CONSTRAINTS: Budget: {profile['budget']}, Cuisine: {profile['cuisine']}.
+    {targets_text(macros)}
+    This is week {week} of a {PROGRAM_WEEKS}-week program. Last week's plan:
+      "d" rows [{", ".join(wire.DIET_COLUMNS)}]: {last[wire.DIET]}
+      "x" rows [{", ".join(wire.WORKOUT_COLUMNS)}]: {last[wire.WORKOUT]}
+    Progress it for week {week}: rotate a few meals for variety and raise workout volume or intensity gradually.
+    Return compact JSON with these keys:
+      "o": 3 short tips for this week
+      "d": ONLY the diet rows you change (at most {MAX_CHANGED_DAYS}), same columns
+      "x": ONLY the workout rows you change (at most {MAX_CHANGED_DAYS}), same columns
+    Do not repeat unchanged days.
+    """
+
+
+def apply_delta(previous, delta, week):
+    """Build week `week` from the previous week's plan and a compact delta."""
+    delta = wire.normalize(delta)
+    diet, diet_days = wire.merge_rows(wire.DIET, previous["diet"], delta.get(wire.DIET))
+    workout, workout_days = wire.merge_rows(wire.WORKOUT, previous["workout"], delta.get(wire.WORKOUT))
+    tips = [str(t).strip() for t in delta.get(wire.OVERVIEW) or [] if str(t).strip()]
+    plan = dict(previous, week=week, overview=tips or previous["overview"], diet=diet, workout=workout,
+                changed={"diet": diet_days, "workout": workout_days})
+    if diet_days:
+        plan["who_analysis"] = score_diet(diet, previous.get("macros"))
+    changed = len(diet_days) + len(workout_days)
+    metrics.incr("program_rows_changed", changed)
+    metrics.incr("program_rows_reused", len(diet) + len(workout) - changed, week=week)
+    return plan
+
+
+def generate_week(profile, macros, week, previous, backend=None):
+    backend = backend or get_backend()
+    with timed("program_week", backend=backend.name, week=week):
+        res = backend.generate(delta_prompt(profile, macros, week, previous), **wire.delta_generation_config())
+    metrics.record_usage(res.usage, stage="program")
+    return apply_delta(previous, parse_plan(res.text), week)
+
+
+class ProgramPlanner:
+    """Lazily materializes program weeks in `store` (a HistoryStore) via `scheduler`."""
+
+    def __init__(self, store, scheduler, backend=None):
+        self.store, self.scheduler, self.backend = store, scheduler, backend
+        self._tickets = {}  # (program_id, week) -> ticket of the build queued for it
+
+    def start(self, plan):
+        """Open a new program whose week 1 is `plan`; returns its id."""
+        program_id = uuid.uuid4().hex
+        self.store.save_week(program_id, 1, dict(plan, week=1, changed={"diet": [], "workout": []}))
+        return program_id
+
+    def get(self, program_id, week):
+        return self.store.get_week(program_id, week)
+
+    def latest(self, program_id):
+        return self.store.latest_week(program_id)
+
+    def _build(self, program_id, week, profile, macros, backend):
+        """Scheduler job: generate `week` alone from the previous week, waiting for that one's own job if needed."""
+        try:
+            plan = self.store.get_week(program_id, week)
+            if plan is None:  # not built by a job that finished before this one was queued
+                previous = self.store.get_week(program_id, week - 1)
+                if previous is None:  # request() queued week - 1 ahead of this job, so it is running or done
+                    ticket = self._tickets.get((program_id, week - 1))
+                    previous = ticket.result() if ticket else {"error": f"week {week - 1} was not built"}
+                    if "error" in previous:
+                        raise RuntimeError(previous["error"])
+                plan = generate_week(profile, macros, week, previous, backend or self.backend)
+                self.store.save_week(program_id, week, plan)
+        except Exception as e:
+            metrics.incr("generation_errors", error=str(e)[:200], week=week)
+            yield ("error", None, {"error": str(e)})
+            return
+        finally:
+            self._tickets.pop((program_id, week), None)
+        yield ("done", None, plan)
+
+    def _submit(self, program_id, week, profile, macros, session_id, backend):
+        ticket = self.scheduler.submit(f"program:{program_id}:{week}", lambda: self._build(program_id, week, profile, macros, backend),
+                                       session_id, requests=1, tokens=1500)
+        self._tickets[(program_id, week)] = ticket
+        return ticket
+
+    def request(self, program_id, week, profile, macros, session_id="anonymous", backend=None):
+        """Ticket for `week`; every missing week before it is queued first, joining any build already in flight.
+
+        `backend` overrides the planner's own for these builds (the requesting session's API key).
+        """
+        for n in range(self.store.latest_week(program_id) + 1, week):
+            self._submit(program_id, n, profile, macros, session_id, backend)
+        return self._submit(program_id, week, profile, macros, session_id, backend)
+
+    def prefetch(self, program_id, completed, profile, macros, session_id="anonymous", backend=None):
+        """After a check-in of `completed` weeks, start building the next ones in the background."""
+        upcoming = range(completed + 1, min(completed + PREFETCH_AHEAD, PROGRAM_WEEKS) + 1)
+        return [self.request(program_id, w, profile, macros, session_id, backend) for w in upcoming
+                if self.store.get_week(program_id, w) is None]
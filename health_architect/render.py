@@ -0,0 +1,191 @@
+"""HTML tables, the macro chart and the page stylesheet, kept out of app.py so they can be benchmarked headless.
+
+Importing this module is cheap: the static templates are built once per process
+here rather than on every script rerun, and pandas/Plotly are only imported when
+the first chart is drawn.
+"""
+from .metrics import timed
+
+METRIC_CARDS = (  # (css class, icon, macros key, unit, colour, label)
+    ("cal", "🔥", "daily_calories", "", "#10b981", "Calories"),
+    ("pro", "🥩", "protein_grams", "g", "#a855f7", "Protein"),
+    ("carb", "🍞", "carbs_grams", "g", "#3b82f6", "Carbs"),
+    ("fat", "🥑", "fats_grams", "g", "#f97316", "Fats"),
+)
+_METRIC_CARD = ('<div class="metric-card {0}"><div style="font-size:2rem;">{1}</div>'
+                '<div class="metric-value" style="color:{4};">{{{2}}}{3}</div><div class="metric-label">{5}</div></div>')
+METRIC_CARD_TEMPLATES = tuple(_METRIC_CARD.format(*card) for card in METRIC_CARDS)
+
+
+APP_CSS = """
+<style>
+    @import url('https://fonts.googleapis.com/css2?family=Outfit:wght@300;400;600;800&display=swap');
+    html, body, [class*="css"] { font-family: 'Outfit', sans-serif; }
+    .stApp { background: radial-gradient(circle at 50% 10%, #2e1065 0%, #0f172a 40%, #000000 100%); color: #e2e8f0; }
+
+    /* GLASS CARDS */
+    .glass-card {
+        background: rgba(255, 255, 255, 0.05);
+        backdrop-filter: blur(12px);
+        border: 1px solid rgba(255, 255, 255, 0.1);
+        border-radius: 20px;
+        padding: 24px;
+        box-shadow: 0 8px 32px rgba(0, 0, 0, 0.3);
+        margin-bottom: 24px;
+    }
+
+    /* --- NAVIGATION BUTTONS (3D GLASS EFFECT) --- */
+    /* Targets: Home Button AND Menu Trigger Button */
+    div.stButton > button, 
+    div[data-testid="stPopover"] > div > button {
+        background: rgba(255, 255, 255, 0.05) !important;
+        backdrop-filter: blur(10px) !important;
+        border: 1px solid rgba(255, 255, 255, 0.1) !important;
+        color: white !important;
+        padding: 12px 20px !important;
+        border-radius: 50px !important; /* Pill Shape */
+        font-weight: 600 !important;
+        box-shadow: 0 4px 6px rgba(0,0,0,0.1) !important;
+        width: 100% !important;
+        transition: all 0.3s ease !important;
+    }
+
+    /* Hover Effect (Neon Glow) */
+    div.stButton > button:hover, 
+    div[data-testid="stPopover"] > div > button:hover {
+        transform: translateY(-3px) !important;
+        box-shadow: 0 0 20px rgba(99, 102, 241, 0.6) !important;
+        border-color: #6366f1 !important;
+        background: rgba(99, 102, 241, 0.1) !important;
+    }
+    
+    /* Force Menu Icon Color to White */
+    div[data-testid="stPopover"] > div > button * {
+        color: white !important;
+        fill: white !important;
+    }
+
+    /* --- DROPDOWN MENU INTERIOR STYLING --- */
+    /* 1. Force the Dropdown Container to be Dark Blue */
+    div[data-testid="stPopoverBody"] {
+        background-color: #6366f1 !important;
+        border: 1px solid rgba(255,255,255,0.15) !important;
+        backdrop-filter: blur(10px);
+        -webkit-backdrop-filter: blur(10px);
+        color: #6366f1 !important;
+    }
+
+    /* 2. Style the Buttons INSIDE the Menu (Glass Effect) */
+    div[data-testid="stPopoverBody"] button {
+        background: rgba(255, 255, 255, 0.15) !important;
+        border: 1px solid rgba(255, 255, 255, 0.2) !important;
+        color: #6366f1 !important;
+        backdrop-filter: blur(10px);
+        -webkit-backdrop-filter: blur(10px);
+        border-radius: 50px !important; /* Pill Shape inside menu */
+        margin-bottom: 8px !important;
+        padding: 10px 15px !important;
+        transition: all 0.2s ease !important;
+    }
+
+    /* 3. Hover Effect for Menu Items */
+    div[data-testid="stPopoverBody"] button:hover {
+        background: rgba(99, 102, 241, 0.2) !important;
+        border-color: #6366f1 !important;
+        box-shadow: 0 0 10px rgba(99, 102, 241, 0.4) !important;
+        transform: translateX(5px) !important;
+    }
+
+    /* 4. Fix Icons inside Menu Items */
+    div[data-testid="stPopoverBody"] button * {
+        color: #6366f1 !important;
+        fill: #6366f1 !important;
+    }
+
+    /* --- COOL ANIMATED TITLE --- */
+    @keyframes shine {
+        0% { background-position: 0% 50%; }
+        50% { background-position: 100% 50%; }
+        100% { background-position: 0% 50%; }
+    }
+    .hero-title {
+        font-size: 3.5rem;
+        font-weight: 800;
+        background: linear-gradient(90deg, #a855f7, #3b82f6, #14b8a6, #a855f7);
+        background-size: 300% 300%;
+        -webkit-background-clip: text;
+        -webkit-text-fill-color: transparent;
+        text-align: center;
+        animation: shine 5s infinite linear;
+        margin-bottom: 5px;
+    }
+    .hero-subtitle { text-align: center; color: #94a3b8; margin-bottom: 25px; letter-spacing: 1px; }
+
+    /* --- 3D NEON METRIC CARDS --- */
+    .metric-card {
+        background: rgba(255, 255, 255, 0.03);
+        border: 1px solid rgba(255, 255, 255, 0.05);
+        border-radius: 20px;
+        padding: 20px;
+        text-align: center;
+        transition: all 0.3s cubic-bezier(0.4, 0, 0.2, 1);
+        cursor: pointer;
+        position: relative;
+        overflow: hidden;
+        box-shadow: 0 4px 6px rgba(0,0,0,0.1);
+    }
+    .metric-card:hover {
+        transform: translateY(-8px) scale(1.02);
+        box-shadow: 0 20px 40px rgba(0,0,0,0.4);
+        border: 1px solid rgba(255, 255, 255, 0.2);
+    }
+    .metric-card.cal:hover { box-shadow: 0 0 30px rgba(16, 185, 129, 0.3); border-color: #10b981; }
+    .metric-card.pro:hover { box-shadow: 0 0 30px rgba(168, 85, 247, 0.3); border-color: #a855f7; }
+    .metric-card.carb:hover { box-shadow: 0 0 30px rgba(59, 130, 246, 0.3); border-color: #3b82f6; }
+    .metric-card.fat:hover { box-shadow: 0 0 30px rgba(249, 115, 22, 0.3); border-color: #f97316; }
+    
+    .metric-value { font-size: 2.2rem; font-weight: 800; margin: 5px 0; }
+    .metric-label { font-size: 0.9rem; text-transform: uppercase; letter-spacing: 1px; opacity: 0.8; }
+
+    /* Download Button */
+    [data-testid="stDownloadButton"] > button {
+        background: linear-gradient(90deg, #10b981 0%, #3b82f6 100%) !important;
+        box-shadow: 0 0 15px rgba(16, 185, 129, 0.4) !important;
+        color: white !important;
+    }
+
+    /* Tables & Progress */
+    .styled-table th { background: linear-gradient(90deg, #6366f1, #8b5cf6); color: white; padding: 12px; }
+    .styled-table td { border-bottom: 1px solid rgba(255,255,255,0.1); padding: 10px; color: #e2e8f0; }
+    .stProgress > div > div > div > div { background-image: linear-gradient(90deg, #6366f1, #38bdf8); }
+</style>
+"""
+
+def metric_cards_html(macros):
+    """One HTML snippet per macro card, in METRIC_CARDS order."""
+    return [template.format(**macros) for template in METRIC_CARD_TEMPLATES]
+
+
+def diet_table_html(diet):
+    rows = "".join([f"<tr><td><strong>{r['day']}</strong></td><td>{r['breakfast']}</td><td>{r['lunch']}</td><td>{r['dinner']}</td></tr>" for r in diet])
+    return f"<table class='styled-table'><thead><tr><th>Day</th><th>Breakfast</th><th>Lunch</th><th>Dinner</th></tr></thead><tbody>{rows}</tbody></table>"
+
+
+def workout_table_html(workout):
+    rows = "".join([f"<tr><td><strong>{r['day']}</strong></td><td>{r['workout']}</td><td>{r['duration']}</td><td>{r['intensity']}</td></tr>" for r in workout])
+    return f"<table class='styled-table'><thead><tr><th>Day</th><th>Focus</th><th>Duration</th><th>Intensity</th></tr></thead><tbody>{rows}</tbody></table>"
+
+
+def macro_figure(protein, carbs, fats):
+    with timed("chart_build"):
+        return _macro_figure(protein, carbs, fats)
+
+
+def _macro_figure(protein, carbs, fats):
+    import pandas as pd
+    import plotly.express as px
+
+    df = pd.DataFrame({"Macro":["P","C","F"], "Value":[protein, carbs, fats]})
+    fig = px.pie(df, values="Value", names="Macro", hole=0.6, color_discrete_sequence=["#a855f7", "#3b82f6", "#f97316"])
+    fig.update_layout(paper_bgcolor="rgba(0,0,0,0)", plot_bgcolor="rgba(0,0,0,0)", font_color="white", height=220, margin=dict(t=0,b=0,l=0,r=0))
+    return fig
@@ -0,0 +1,96 @@
+"""PDF report rendering straight to bytes, memoized by a hash of the plan content."""
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from itertools import accumulate
+
+from .metrics import metrics, timed
+
+PDF_CACHE_SIZE = 32
+LINE_HEIGHT, MIN_ROW_HEIGHT, PAGE_BOTTOM = 5, 8, 270
+
+# (headers, column widths, plan fields)
+DIET_TABLE = (["Day", "Breakfast", "Lunch", "Dinner"], [25, 55, 55, 55], ["day", "breakfast", "lunch", "dinner"])
+WORKOUT_TABLE = (["Day", "Focus Area", "Duration", "Intensity"], [25, 80, 40, 45], ["day", "workout", "duration", "intensity"])
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def safe_text(text): return str(text).encode("latin-1", "ignore").decode("latin-1")
+
+
+@lru_cache(maxsize=None)
+def pdf_class():
+    """The FPDF subclass, built on first render: fpdf (with Pillow and fontTools) takes ~0.5 s to import."""
+    from fpdf import FPDF
+
+    class PDF(FPDF):
+        def header(self):
+            self.set_font('Arial', 'B', 20); self.set_text_color(99, 102, 241)
+            self.cell(0, 10, 'AI Health Architect', 0, 1, 'C'); self.ln(5)
+
+    return PDF
+
+
+def _draw_table(pdf, title, table, rows):
+    headers, widths, fields = table
+    offsets = [0, *accumulate(widths)][:-1]
+
+    pdf.set_font("Arial", "B", 14); pdf.set_text_color(99, 102, 241); pdf.cell(0, 10, title, ln=True)
+    pdf.set_font("Arial", "B", 10); pdf.set_text_color(255); pdf.set_fill_color(99, 102, 241)
+    for h, w in zip(headers, widths): pdf.cell(w, 8, h, 1, 0, 'C', 1)
+    pdf.ln(); pdf.set_text_color(0); pdf.set_font("Arial", size=9)
+
+    # Lay out the whole table once (text and row heights), then draw it.
+    cells = [[safe_text(r[f]) for f in fields] for r in rows]
+    heights = [
+        max(MIN_ROW_HEIGHT, *(len(pdf.multi_cell(w, LINE_HEIGHT, text, split_only=True)) * LINE_HEIGHT for w, text in zip(widths, row)))
+        for row in cells
+    ]
+    for row, h in zip(cells, heights):
+        if pdf.get_y() + h > PAGE_BOTTOM: pdf.add_page(); pdf.ln()
+        x, y = pdf.get_x(), pdf.get_y()
+        for offset, w, text in zip(offsets, widths, row):
+            pdf.set_xy(x + offset, y); pdf.multi_cell(w, LINE_HEIGHT, text, border=1)
+            pdf.rect(x + offset, y, w, h)
+        pdf.set_y(y + h)
+
+
+def render_pdf(plan):
+    pdf = pdf_class()(); pdf.add_page(); pdf.set_font("Arial", "I", 10); pdf.set_text_color(100)
+    pdf.cell(0, 10, f"Generated: {plan['date']}", ln=True, align='C'); pdf.ln(5)
+    pdf.set_font("Arial", "B", 12); pdf.set_text_color(0); pdf.cell(0, 8, "Overview", ln=True)
+    pdf.set_font("Arial", size=10)
+    for p in plan["data"]["overview"]: pdf.multi_cell(0, 6, safe_text(f"- {p}"), new_x="LMARGIN", new_y="NEXT")
+    pdf.ln(5)
+
+    _draw_table(pdf, "Diet Schedule", DIET_TABLE, plan["data"]["diet"])
+    pdf.ln(10)
+    if pdf.get_y() > 250: pdf.add_page()
+    _draw_table(pdf, "Workout Schedule", WORKOUT_TABLE, plan["data"]["workout"])
+
+    return bytes(pdf.output())
+
+
+def plan_digest(plan):
+    return hashlib.sha256(json.dumps(plan, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+
+def generate_pdf(plan):
+    """PDF bytes for a stored plan ({"date": ..., "data": ...}); identical plans are rendered once."""
+    digest = plan_digest(plan)
+    with _lock:
+        if digest in _cache:
+            _cache.move_to_end(digest)
+            metrics.incr("pdf_cache_hits")
+            return _cache[digest]
+    with timed("pdf_render"):
+        data = render_pdf(plan)
+    with _lock:
+        _cache[digest] = data
+        while len(_cache) > PDF_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return data
@@ -0,0 +1,256 @@
+"""Process-wide single-flight scheduler in front of plan generation.
+
+Identical in-flight requests (same cache key) are coalesced onto one ticket, so a
+classroom pressing "Generate" for the same profile costs a single model call. All
+sessions share a requests-per-minute and tokens-per-minute budget; work that does
+not fit yet waits in a per-session round-robin queue and gets a position and ETA
+instead of a quota error. Each ticket reserves an estimate of its tokens that is
+replaced by the real usage once it finishes, and the estimate follows recent usage.
+A 429 from the model pauses all dispatch with exponential backoff and puts the
+ticket back at the head of the queue instead of failing it, as long as nothing
+but locally computed sections (the fixed macros) was published; the rerun skips
+the events its subscribers have already seen.
+
+Jobs are callables returning an event iterator (engine.generate_plan_stream or
+sections.iter_plan_sections). A worker drains it into the ticket, and every
+subscriber replays the same events through Ticket.iter_events().
+"""
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from .backends import is_quota_error
+from .metrics import collect_usage, metrics
+
+WINDOW_SECONDS = 60.0
+LOCAL_SECTIONS = ("macros",)  # emitted by jobs before the model is called, identical on every run
+TOKENS_PER_REQUEST = 4000  # initial reservation per model request, until real usage is seen
+QUOTA_BACKOFF_SECONDS = float(os.environ.get("SCHEDULER_QUOTA_BACKOFF_SECONDS", "15"))
+MAX_QUOTA_RETRIES = 3
+
+
+class Ticket:
+    def __init__(self, key, job, session_id, requests, tokens):
+        self.key, self.job, self.session_id = key, job, session_id
+        self.requests, self.tokens = requests, tokens
+        self.enqueued_at = time.monotonic()
+        self.started_at = self.finished_at = None
+        self.subscribers = 1
+        self.quota_retries = 0
+        self.reservation = None  # [start time, tokens] entry in the scheduler's token log
+        self.events = []
+        self.started = threading.Event()
+        self._cond = threading.Condition()
+        self._finished = False
+
+    def _publish(self, event):
+        with self._cond:
+            self.events.append(event)
+            self._cond.notify_all()
+
+    def _finish(self):
+        with self._cond:
+            self._finished = True
+            self.finished_at = time.monotonic()
+            self._cond.notify_all()
+
+    def iter_events(self, timeout=None):
+        """Replay every event from the start, blocking for new ones until the job finishes."""
+        i = 0
+        while True:
+            with self._cond:
+                while i >= len(self.events) and not self._finished:
+                    if not self._cond.wait(timeout):
+                        return
+                batch, finished = self.events[i:], self._finished
+            yield from batch
+            i += len(batch)
+            if finished and i >= len(self.events):
+                return
+
+    def result(self, timeout=None):
+        for kind, _, value in self.iter_events(timeout):
+            if kind in ("done", "error"):
+                return value
+        return {"error": "Request timed out in the scheduler."}
+
+
+class RequestScheduler:
+    def __init__(self, rpm=10, tpm=250_000, workers=4):
+        self.rpm, self.tpm, self.workers = rpm, tpm, workers
+        self._queues = OrderedDict()  # session_id -> deque[Ticket], rotated for round-robin fairness
+        self._inflight = {}  # key -> Ticket (queued or running)
+        self._request_log = deque()  # (start time, requests)
+        self._token_log = deque()  # [start time, tokens]; the estimate is replaced by real usage
+        self._cond = threading.Condition()
+        self._running = 0
+        self._blocked_until = 0.0
+        self._paused_until = 0.0  # global backoff after a 429
+        self._tokens_per_request = float(TOKENS_PER_REQUEST)  # moving average of real usage
+        self._service_seconds = 8.0  # moving average of job duration, seeds the ETA
+        self._waits = deque(maxlen=200)
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="plan-worker")
+        threading.Thread(target=self._dispatch_loop, name="plan-scheduler", daemon=True).start()
+
+    # ---- submission -------------------------------------------------
+    def submit(self, key, job, session_id="anonymous", requests=1, tokens=None):
+        """Queue `job` under `key`, or join the identical request already in flight.
+
+        `tokens` is the budget to reserve; by default it is estimated from recent usage.
+        """
+        with self._cond:
+            ticket = self._inflight.get(key)
+            if ticket is not None:
+                ticket.subscribers += 1
+                metrics.incr("scheduler_coalesced")
+                return ticket
+            ticket = Ticket(key, job, session_id, requests, tokens or round(self._tokens_per_request * requests))
+            self._inflight[key] = ticket
+            self._queues.setdefault(session_id, deque()).append(ticket)
+            metrics.incr("scheduler_submitted")
+            metrics.set_gauge("scheduler_queue_depth", sum(len(q) for q in self._queues.values()))
+            self._cond.notify_all()
+            return ticket
+
+    # ---- dispatch ---------------------------------------------------
+    def _budget_wait(self, ticket, now):
+        """Seconds until `ticket` fits in the rolling RPM/TPM window (0 if it fits now)."""
+        for log in (self._request_log, self._token_log):
+            while log and now - log[0][0] >= WINDOW_SECONDS:
+                log.popleft()
+        wait = 0.0
+        for log, limit, need in ((self._request_log, self.rpm, ticket.requests), (self._token_log, self.tpm, ticket.tokens)):
+            used = sum(n for _, n in log)
+            for ts, n in log:
+                if used + need <= limit:
+                    break
+                used -= n
+                wait = max(wait, ts + WINDOW_SECONDS - now)
+        return wait
+
+    def _next_ticket(self):
+        session_id, queue = next(iter(self._queues.items()))
+        ticket = queue.popleft()
+        del self._queues[session_id]
+        if queue:
+            self._queues[session_id] = queue  # back of the line for this session's next request
+        return ticket
+
+    def _dispatch_loop(self):
+        while True:
+            with self._cond:
+                while not self._queues or self._running >= self.workers:
+                    self._cond.wait()
+                now = time.monotonic()
+                head = next(iter(self._queues.values()))[0]
+                wait = max(self._budget_wait(head, now), self._paused_until - now)
+                if wait > 0:
+                    self._blocked_until = now + wait
+                    self._cond.wait(wait)
+                    continue
+                ticket = self._next_ticket()
+                self._request_log.append((now, ticket.requests))
+                ticket.reservation = [now, ticket.tokens]
+                self._token_log.append(ticket.reservation)
+                self._running += 1
+                ticket.started_at = now
+                self._waits.append(now - ticket.enqueued_at)
+                depth = sum(len(q) for q in self._queues.values())
+            metrics.set_gauge("scheduler_queue_depth", depth)
+            metrics.observe("scheduler_wait", ticket.started_at - ticket.enqueued_at, session=ticket.session_id)
+            ticket.started.set()
+            self._pool.submit(self._run, ticket)
+
+    def _run(self, ticket):
+        requeued = False
+        replayed = len(ticket.events)  # local events a requeued ticket already published
+        with collect_usage() as usage:
+            try:
+                for i, event in enumerate(ticket.job()):
+                    if i < replayed:
+                        continue
+                    if event[0] == "error" and self._backoff(ticket, event[2]["error"]):
+                        requeued = True
+                        break
+                    ticket._publish(event)
+            except Exception as e:
+                if not self._backoff(ticket, str(e)):
+                    ticket._publish(("error", None, {"error": str(e)}))
+                else:
+                    requeued = True
+        if not requeued:
+            ticket._finish()
+        with self._cond:
+            self._running -= 1
+            if sum(usage) or requeued:  # the real cost replaces the estimate in the TPM window; a 429 costs nothing
+                ticket.reservation[1] = sum(usage)
+            if sum(usage):
+                self._tokens_per_request = 0.8 * self._tokens_per_request + 0.2 * sum(usage) / ticket.requests
+            if not requeued:
+                if self._inflight.get(ticket.key) is ticket:
+                    del self._inflight[ticket.key]
+                self._service_seconds = 0.8 * self._service_seconds + 0.2 * (ticket.finished_at - ticket.started_at)
+            self._cond.notify_all()
+
+    def _backoff(self, ticket, message):
+        """On a 429 before any model output was published, pause dispatch and requeue `ticket` at the head; True if requeued."""
+        model_output = any(kind != "section" or name not in LOCAL_SECTIONS for kind, name, _ in ticket.events)
+        if not is_quota_error(message) or model_output or ticket.quota_retries >= MAX_QUOTA_RETRIES:
+            return False
+        delay = QUOTA_BACKOFF_SECONDS * 2 ** ticket.quota_retries
+        ticket.quota_retries += 1
+        with self._cond:
+            self._paused_until = max(self._paused_until, time.monotonic() + delay)
+            self._blocked_until = max(self._blocked_until, self._paused_until)
+            self._queues.setdefault(ticket.session_id, deque()).appendleft(ticket)
+            self._queues.move_to_end(ticket.session_id, last=False)
+        metrics.incr("scheduler_quota_backoff", delay=delay, retry=ticket.quota_retries, session=ticket.session_id)
+        return True
+
+    # ---- observability ----------------------------------------------
+    def position(self, ticket):
+        """1-based place in the dispatch order (0 once started)."""
+        with self._cond:
+            if ticket.started.is_set():
+                return 0
+            queues = [list(q) for q in self._queues.values()]
+        order, depth = [], max((len(q) for q in queues), default=0)
+        for i in range(depth):
+            order += [q[i] for q in queues if i < len(q)]
+        return order.index(ticket) + 1 if ticket in order else 0
+
+    def eta(self, ticket):
+        """Rough seconds until `ticket` starts, from worker throughput and the rate budget."""
+        ahead = self.position(ticket)
+        if ahead == 0:
+            return 0.0
+        by_workers = (ahead - 1 + max(0, self._running - self.workers + 1)) / self.workers * self._service_seconds
+        by_rate = (ahead - 1) * WINDOW_SECONDS / max(self.rpm, 1)
+        return max(by_workers, by_rate, self._blocked_until - time.monotonic(), 0.0)
+
+    def stats(self):
+        with self._cond:
+            depth = sum(len(q) for q in self._queues.values())
+            stats = {
+                "queue_depth": depth,
+                "running": self._running,
+                "sessions_waiting": len(self._queues),
+                "requests_last_min": sum(n for _, n in self._request_log),
+                "tokens_last_min": sum(n for _, n in self._token_log),
+                "tokens_per_request": round(self._tokens_per_request),
+                "paused_s": round(max(0.0, self._paused_until - time.monotonic()), 1),
+                "avg_wait_s": round(sum(self._waits) / len(self._waits), 2) if self._waits else 0.0,
+                "max_wait_s": round(max(self._waits), 2) if self._waits else 0.0,
+            }
+        metrics.set_gauge("scheduler_queue_depth", depth)
+        return stats
+
+
+def scheduler_from_env():
+    return RequestScheduler(
+        rpm=int(os.environ.get("SCHEDULER_RPM", "10")),
+        tpm=int(os.environ.get("SCHEDULER_TPM", "250000")),
+        workers=int(os.environ.get("SCHEDULER_WORKERS", "4")),
+    )
@@ -0,0 +1,135 @@
+"""Sectioned generation: the monolithic prompt split into smaller sub-requests run concurrently.
+
+Phase one asks only for the short overview/macros section. Phase two sends the
+diet and workout prompts in parallel with those macros as context, so wall-clock
+time follows the longest single table rather than the whole plan. When the macros
+are computed locally (see nutrition.py) there is no phase one: all three requests
+start at once. The WHO score is computed locally from the finished diet (who.py).
+"""
+import contextvars
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from .backends import get_backend
+from .engine import MACROS_SCHEMA, parse_plan, targets_text
+from .metrics import metrics, timed
+from .who import score_diet
+
+SECTION_ATTEMPTS = 3
+RETRY_BACKOFF_SECONDS = 1.0
+
+
+class SectionError(Exception):
+    def __init__(self, section, cause):
+        super().__init__(f"{section} section failed: {cause}")
+        self.section = section
+
+
+def _profile_text(age, bmi, activity, food, goal, budget, cuisine):
+    return (f"PROFILE: Age: {age}, BMI: {bmi}, Activity: {activity}, Diet: {food}, Goal: {goal}\n"
+            f"    CONSTRAINTS: Budget: {budget}, Cuisine: {cuisine}.")
+
+
+def core_prompt(profile_text, macros=None):
+    return f"""
+    Act as a professional Nutritionist. Return ONLY valid JSON.
+    {profile_text}
+    {targets_text(macros)}
+    JSON Structure:
+    {{
+      {"" if macros else MACROS_SCHEMA}
+      "overview": ["tip1", "tip2", "tip3"]
+    }}
+    """
+
+
+def diet_prompt(profile_text, macros):
+    return f"""
+    Act as a professional Nutritionist. Return ONLY valid JSON.
+    {profile_text}
+    {targets_text(macros)}
+    Build a 7-day meal plan that meets these targets.
+    JSON Structure:
+    {{ "diet": [ {{"day":"Mon", "breakfast":"...", "lunch":"...", "dinner":"..."}}, ... ] }}
+    """
+
+
+def workout_prompt(profile_text, macros):
+    return f"""
+    Act as a professional Fitness Coach. Return ONLY valid JSON.
+    {profile_text}
+    {targets_text(macros)}
+    Build a 7-day workout plan consistent with this energy intake.
+    JSON Structure:
+    {{ "workout": [ {{"day":"Mon", "workout":"...", "duration":"...", "intensity":"..."}}, ... ] }}
+    """
+
+
+def generate_section(name, prompt, keys, attempts=SECTION_ATTEMPTS, backoff=RETRY_BACKOFF_SECONDS, backend=None, usage=None):
+    """Run one sub-prompt, retrying only this section on API or parse failures.
+
+    Token counts of every attempt are added into `usage` when given.
+    """
+    backend = backend or get_backend()
+    for attempt in range(attempts):
+        try:
+            with timed(f"section_{name}", backend=backend.name, attempt=attempt):
+                res = backend.generate(prompt)
+            metrics.record_usage(res.usage)
+            if usage is not None:
+                for k, v in res.usage.items():
+                    usage[k] = usage.get(k, 0) + v
+            data = parse_plan(res.text)
+            missing = [k for k in keys if k not in data]
+            if missing:
+                raise ValueError(f"missing keys {missing}")
+            return {k: data[k] for k in keys}
+        except Exception as e:
+            if attempt == attempts - 1:
+                raise SectionError(name, e) from e
+            metrics.incr("section_retries", section=name, error=str(e)[:200])
+            time.sleep(backoff * 2 ** attempt)
+
+
+def iter_plan_sections(age, bmi, activity, food, goal, budget, cuisine, macros=None, attempts=SECTION_ATTEMPTS, backend=None):
+    """Yield events in the same shape as engine.generate_plan_stream so the UI can render either."""
+    backend = backend or get_backend()
+    profile_text = _profile_text(age, bmi, activity, food, goal, budget, cuisine)
+    plan = {}
+    try:
+        jobs = {}
+        if macros:
+            plan["macros"] = macros
+            yield ("section", "macros", macros)
+            jobs["core"] = (core_prompt(profile_text, macros), ("overview",))
+        else:
+            core = generate_section("core", core_prompt(profile_text), ("overview", "macros"), attempts, backend=backend)
+            for key, value in core.items():
+                plan[key] = value
+                yield ("section", key, value)
+
+        jobs["diet"] = (diet_prompt(profile_text, plan["macros"]), ("diet",))
+        jobs["workout"] = (workout_prompt(profile_text, plan["macros"]), ("workout",))
+        with ThreadPoolExecutor(max_workers=len(jobs)) as pool:
+            # Each section runs in a copy of this context so its token usage is credited to the caller's scheduler ticket.
+            futures = {pool.submit(contextvars.copy_context().run, generate_section, name, prompt, keys, attempts, backend=backend): name
+                       for name, (prompt, keys) in jobs.items()}
+            for future in as_completed(futures):
+                for key, value in future.result().items():
+                    plan[key] = value
+                    if key in ("diet", "workout"):
+                        for row in value:
+                            yield ("item", key, row)
+                    yield ("section", key, value)
+        plan["who_analysis"] = score_diet(plan["diet"], plan["macros"])
+        yield ("section", "who_analysis", plan["who_analysis"])
+    except Exception as e:
+        yield ("error", None, {"error": str(e)})
+        return
+    yield ("done", None, plan)
+
+
+def generate_plan_sectioned(age, bmi, activity, food, goal, budget, cuisine, macros=None, attempts=SECTION_ATTEMPTS, backend=None):
+    for kind, _, value in iter_plan_sections(age, bmi, activity, food, goal, budget, cuisine, macros, attempts, backend):
+        if kind in ("done", "error"):
+            return value
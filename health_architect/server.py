@@ -0,0 +1,274 @@
+"""Headless HTTP API for plan generation: python -m health_architect.server --port 8000
+
+    POST /plans               generate (JSON body: a profile as in batch.py, plus optional
+                              "engine": "stream"|"sections", "session_id" and "user_id");
+                              ?stream=1 answers with NDJSON events as sections arrive
+    GET  /plans?user_id=      paginated summaries (limit, offset; or ?session_id=)
+    GET  /plans/{id}          stored plan
+    GET  /plans/{id}/pdf      rendered PDF report
+    GET  /export/diet.csv     one row per plan-day, streamed (also workout.csv; ?user_id= or ?session_id= required)
+    GET  /healthz, /metrics   scheduler stats, Prometheus text
+
+Generation goes through the same plan cache, single-flight scheduler and history
+store as the Streamlit app, so identical requests from either side share one model
+call. Waiting on a ticket and rendering PDFs happen on bounded thread pools, every
+request has a deadline, and over capacity the server answers 503 instead of queueing
+without limit. Only the pipeline modules are imported (no Streamlit, Plotly or
+pandas), so a worker boots in well under a second.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from .backends import is_quota_error
+from .batch import PROFILE_FIELDS, normalize_profile
+from .cache import PlanCache, profile_key
+from .engine import generate_plan_stream
+from .export import TABLES, iter_csv, plan_day_rows
+from .history import open_history
+from .metrics import metrics
+from .neighbors import PlanIndex
+from .nutrition import compute_macros
+from .report import generate_pdf
+from .scheduler import scheduler_from_env
+from .sections import iter_plan_sections
+
+REQUEST_TIMEOUT_SECONDS = float(os.environ.get("SERVICE_TIMEOUT_SECONDS", "120"))
+MAX_STREAMS = int(os.environ.get("SERVICE_MAX_STREAMS", "32"))
+PDF_WORKERS = int(os.environ.get("SERVICE_PDF_WORKERS", "2"))
+ENGINES = {"stream": generate_plan_stream, "sections": iter_plan_sections}
+MAX_PAGE_SIZE = 100
+
+
+def _error(status, message, **headers):
+    return JSONResponse({"error": message}, status_code=status, headers=headers or None)
+
+
+class PlanService:
+    """Shared resources and request handlers; built once per worker process at startup."""
+
+    def __init__(self, cache=None, history=None, scheduler=None, index=None, timeout=REQUEST_TIMEOUT_SECONDS,
+                 max_streams=MAX_STREAMS, pdf_workers=PDF_WORKERS):
+        self.cache = cache or PlanCache()
+        self.history = history or open_history()
+        self.scheduler = scheduler or scheduler_from_env()
+        self.index = index or PlanIndex()
+        self.timeout = timeout
+        self.max_streams = max_streams
+        self.active = 0
+        # One thread per request blocked on a ticket, so the event loop never waits on the scheduler.
+        self.waiters = ThreadPoolExecutor(max_workers=max_streams, thread_name_prefix="plan-wait")
+        self.renderers = ThreadPoolExecutor(max_workers=pdf_workers, thread_name_prefix="pdf-render")
+
+    def close(self):
+        self.waiters.shutdown(wait=False, cancel_futures=True)
+        self.renderers.shutdown(wait=False, cancel_futures=True)
+
+    # ---- generation -------------------------------------------------
+    async def _ticket_events(self, ticket):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.timeout
+        events = ticket.iter_events(timeout=self.timeout)
+        while True:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                raise asyncio.TimeoutError
+            event = await asyncio.wait_for(loop.run_in_executor(self.waiters, next, events, None), remaining)
+            if event is None:
+                raise asyncio.TimeoutError
+            yield event
+            if event[0] in ("done", "error"):
+                return
+
+    async def _save(self, profile, plan, session_id, user_id, key, fresh, started):
+        """Persist a finished plan the way the app does; returns its history id."""
+        def save():
+            if fresh:
+                self.cache.put(key, plan, time.perf_counter() - started)
+                self.index.add(profile, plan)
+            entry = {"date": datetime.now().strftime("%Y-%m-%d"), "data": plan}
+            return self.history.add(session_id, entry, goal=profile["goal"], user_id=user_id)
+        return await asyncio.to_thread(save)
+
+    async def _generate(self, profile, engine, session_id, user_id=None):
+        """Async iterator of NDJSON-ready dicts, ending with a "done" or "error" message."""
+        started = time.perf_counter()
+        args = [profile[k] for k in PROFILE_FIELDS]
+        macros = compute_macros(profile["age"], profile["height"], profile["weight"], profile["sex"],
+                                profile["activity"], profile["goal"]) if all(k in profile for k in ("height", "weight", "sex")) else None
+        key = profile_key(*args, macros=macros)
+        plan, source = await asyncio.to_thread(self.cache.lookup, key)
+        ok = joined = False
+        try:
+            if plan is None:
+                job = ENGINES[engine]
+                ticket = self.scheduler.submit(key, lambda: job(*args, macros=macros), session_id,
+                                               requests=3 if engine == "sections" else 1)
+                joined = ticket.subscribers > 1
+                async for kind, section, value in self._ticket_events(ticket):
+                    if kind == "error":
+                        yield {"event": "error", "error": value["error"], "quota": is_quota_error(value["error"])}
+                        return
+                    if kind == "done":
+                        plan = value
+                        break
+                    yield {"event": kind, "key": section, "value": value}
+            plan_id = await self._save(profile, plan, session_id, user_id, key, source == "miss" and not joined, started)
+            ok = True
+            yield {"event": "done", "id": plan_id, "cache": source, "plan": plan}
+        except asyncio.TimeoutError:
+            yield {"event": "error", "error": f"Plan generation timed out after {self.timeout:.0f}s.", "timeout": True}
+        finally:
+            metrics.observe("api_generate", time.perf_counter() - started, engine=engine, cache=source, ok=ok)
+
+    async def create_plan(self, request):
+        try:
+            body = await request.json()
+            if not isinstance(body, dict):
+                return _error(400, "invalid profile: expected a JSON object")
+            profile = normalize_profile(body)  # also rejects enum values compute_macros would only fail on mid-stream
+        except KeyError as e:
+            return _error(400, f"invalid profile: missing {e.args[0]!r}")
+        except (ValueError, TypeError) as e:
+            return _error(400, f"invalid profile: {e}")
+        engine = body.get("engine", "stream")
+        if engine not in ENGINES:
+            return _error(400, f"unknown engine {engine!r}; expected one of {sorted(ENGINES)}")
+        if self.active >= self.max_streams:
+            metrics.incr("api_rejected")
+            return _error(503, "Too many generations in progress; retry shortly.", **{"Retry-After": "5"})
+        session_id = str(body.get("session_id") or request.headers.get("x-session-id") or "api")
+
+        self.active += 1
+        user_id = body.get("user_id")
+        messages = self._generate(profile, engine, session_id, str(user_id) if user_id else None)
+        if request.query_params.get("stream") in ("1", "true"):
+            async def ndjson():
+                try:
+                    async for message in messages:
+                        yield json.dumps(message) + "\n"
+                finally:
+                    self.active -= 1
+            return StreamingResponse(ndjson(), media_type="application/x-ndjson")
+        try:
+            async for message in messages:
+                last = message
+        finally:
+            self.active -= 1
+        if last["event"] == "done":
+            return JSONResponse({k: last[k] for k in ("id", "cache", "plan")})
+        status = 504 if last.get("timeout") else 429 if last.get("quota") else 502
+        return _error(status, last["error"])
+
+    # ---- reads ------------------------------------------------------
+    async def _entry(self, request):
+        try:
+            entry_id = int(request.path_params["plan_id"])
+        except ValueError:
+            return None
+        return await asyncio.to_thread(self.history.get, entry_id)
+
+    async def list_plans(self, request):
+        params = request.query_params
+        session_id, user_id = params.get("session_id"), params.get("user_id")
+        if not (session_id or user_id):
+            return _error(400, "user_id or session_id is required")
+        try:
+            limit = min(int(params.get("limit", 10)), MAX_PAGE_SIZE)
+            offset = int(params.get("offset", 0))
+        except ValueError:
+            return _error(400, "limit and offset must be integers")
+        if limit <= 0 or offset < 0:
+            return _error(400, "limit must be positive and offset non-negative")
+        count, items = await asyncio.gather(asyncio.to_thread(self.history.count, session_id, user_id),
+                                            asyncio.to_thread(self.history.page, session_id, limit, offset, user_id))
+        return JSONResponse({"count": count, "items": items})
+
+    async def get_plan(self, request):
+        entry = await self._entry(request)
+        return JSONResponse(entry) if entry else _error(404, "plan not found")
+
+    async def get_pdf(self, request):
+        entry = await self._entry(request)
+        if not entry:
+            return _error(404, "plan not found")
+        loop = asyncio.get_running_loop()
+        try:
+            pdf = await asyncio.wait_for(loop.run_in_executor(self.renderers, generate_pdf, entry), self.timeout)
+        except asyncio.TimeoutError:
+            return _error(504, "PDF rendering timed out.")
+        headers = {"Content-Disposition": f'attachment; filename="health_plan_{request.path_params["plan_id"]}.pdf"'}
+        return Response(pdf, media_type="application/pdf", headers=headers)
+
+    async def export_csv(self, request):
+        table = request.path_params["table"]
+        if table not in TABLES:
+            return _error(404, f"unknown table {table!r}; expected one of {sorted(TABLES)}")
+        params = request.query_params
+        session_id, user_id = params.get("session_id"), params.get("user_id")
+        if not (session_id or user_id):  # a whole-store dump is for the CLI (python -m health_architect.export)
+            return _error(400, "user_id or session_id is required")
+        entries = self.history.iter_entries(session_id, user_id=user_id)
+        chunks = iter_csv(plan_day_rows(entries, table), TABLES[table])
+        # A sync iterator: Starlette pulls it on its threadpool, so SQLite reads never block the loop.
+        headers = {"Content-Disposition": f'attachment; filename="{table}.csv"'}
+        return StreamingResponse(chunks, media_type="text/csv", headers=headers)
+
+    async def healthz(self, request):
+        return JSONResponse({"ok": True, "active": self.active, "scheduler": self.scheduler.stats()})
+
+    async def prometheus(self, request):
+        return PlainTextResponse(metrics.render_prometheus())
+
+
+def create_app(service_factory=PlanService):
+    """ASGI app; the service (SQLite handles, thread pools, scheduler) is created on startup."""
+    state = {}
+
+    @asynccontextmanager
+    async def lifespan(app):
+        state["service"] = await asyncio.to_thread(service_factory)
+        yield
+        state.pop("service").close()
+
+    def handler(name):
+        async def endpoint(request):
+            return await getattr(state["service"], name)(request)
+        return endpoint
+
+    return Starlette(lifespan=lifespan, routes=[
+        Route("/plans", handler("create_plan"), methods=["POST"]),
+        Route("/plans", handler("list_plans"), methods=["GET"]),
+        Route("/plans/{plan_id}", handler("get_plan"), methods=["GET"]),
+        Route("/plans/{plan_id}/pdf", handler("get_pdf"), methods=["GET"]),
+        Route("/export/{table}.csv", handler("export_csv"), methods=["GET"]),
+        Route("/healthz", handler("healthz"), methods=["GET"]),
+        Route("/metrics", handler("prometheus"), methods=["GET"]),
+    ])
+
+
+app = create_app()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve the plan generator over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=1, help="server processes (each has its own scheduler)")
+    args = parser.parse_args(argv)
+
+    import uvicorn
+    uvicorn.run("health_architect.server:app", host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == "__main__":
+    main()
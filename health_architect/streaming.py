@@ -0,0 +1,114 @@
+"""Incremental parser that surfaces plan sections while the model response is still streaming."""
+import json
+
+WHITESPACE = " \t\r\n"
+
+
+class IncrementalPlanParser:
+    """Feed raw text chunks; get back events for every top-level section as soon as it closes.
+
+    Events are ``("section", key, value)`` for each finished top-level key and
+    ``("item", key, value)`` for each finished object or row array inside a
+    streamed array (``diet``/``workout`` by default). Anything before the first
+    ``{`` (such as a ```json fence) is ignored.
+    """
+
+    def __init__(self, stream_arrays=("diet", "workout")):
+        self.stream_arrays = set(stream_arrays)
+        self.sections = {}
+        self.done = False
+        self._text = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_str = False
+        self._esc = False
+        self._started = False
+        self._state = "key"  # key -> colon -> value -> in_value -> after
+        self._key = None
+        self._key_start = None
+        self._value_start = None
+        self._item_start = None
+
+    def feed(self, chunk):
+        self._text += chunk
+        text, events = self._text, []
+        i = self._pos
+        while i < len(text) and not self.done:
+            ch = text[i]
+            if self._in_str:
+                if self._esc:
+                    self._esc = False
+                elif ch == "\\":
+                    self._esc = True
+                elif ch == '"':
+                    self._in_str = False
+                    if self._depth == 1 and self._state == "key":
+                        self._key = json.loads(text[self._key_start:i + 1])
+                        self._state = "colon"
+            elif not self._started:
+                if ch == "{":
+                    self._started, self._depth = True, 1
+            elif self._depth == 1:
+                self._top_level(ch, i, events)
+            else:
+                self._nested(ch, i, events)
+            i += 1
+        self._pos = i
+        return events
+
+    def _top_level(self, ch, i, events):
+        state = self._state
+        if state == "key":
+            if ch == '"':
+                self._in_str, self._key_start = True, i
+            elif ch == "}":
+                self.done, self._depth = True, 0
+        elif state == "colon":
+            if ch == ":":
+                self._state = "value"
+        elif state == "value":
+            if ch in WHITESPACE:
+                return
+            self._value_start, self._state = i, "in_value"
+            if ch in "{[":
+                self._depth += 1
+            elif ch == '"':
+                self._in_str = True
+        elif state == "in_value":
+            # Only scalars (strings, numbers, literals) end at depth 1.
+            if ch in ",}":
+                self._emit_section(self._text[self._value_start:i], events)
+                self._state = "key"
+                if ch == "}":
+                    self.done, self._depth = True, 0
+        elif state == "after":
+            if ch == ",":
+                self._state = "key"
+            elif ch == "}":
+                self.done, self._depth = True, 0
+
+    def _nested(self, ch, i, events):
+        if ch == '"':
+            self._in_str = True
+        elif ch in "{[":
+            self._depth += 1
+            if self._depth == 3 and self._key in self.stream_arrays:
+                self._item_start = i
+        elif ch in "}]":
+            self._depth -= 1
+            if self._depth == 2 and self._item_start is not None:
+                events.append(("item", self._key, json.loads(self._text[self._item_start:i + 1])))
+                self._item_start = None
+            elif self._depth == 1:
+                self._emit_section(self._text[self._value_start:i + 1], events)
+                self._state = "after"
+
+    def _emit_section(self, raw, events):
+        value = json.loads(raw.strip())
+        self.sections[self._key] = value
+        events.append(("section", self._key, value))
+        self._key = self._value_start = None
+
+    @property
+    def text(self):
+        return self._text
@@ -0,0 +1,97 @@
+"""Local WHO compliance score for a plan's meals.
+
+Every breakfast/lunch/dinner string is parsed into dishes and priced against the
+offline food database (foods.py). The daily averages are then checked against the
+WHO healthy-diet guidance (free sugars and saturated fat under 10% of energy, total
+fat under 30%, sodium under 2 g, at least 400 g of fruit and vegetables) plus fibre,
+and against the plan's own calorie and protein targets, so the score also catches
+meals that do not add up to the macros. Scores are out of 10 in half points.
+"""
+import re
+
+import numpy as np
+
+from .foods import NUTRIENTS, food_database
+from .metrics import timed
+
+MEALS = ("breakfast", "lunch", "dinner")
+WEIGHTS = {"energy": 2.0, "protein": 1.0, "free_sugar": 1.5, "fat": 1.0, "sat_fat": 1.0, "sodium": 1.0, "produce": 1.5, "fiber": 1.0}
+ENERGY_SHARE_LIMITS = {"free_sugar": 0.10, "fat": 0.30, "sat_fat": 0.10}
+SODIUM_LIMIT_MG = 2000
+PRODUCE_TARGET_G = 400
+FIBER_TARGET_G = 25
+TARGET_TOLERANCE = 0.15  # within ±15% of the calorie/protein target earns full marks
+KCAL_PER_G_FAT, KCAL_PER_G_SUGAR = 9, 4
+
+
+def _at_most(value, limit):
+    return 1.0 if value <= limit else max(0.0, 2.0 - value / limit)
+
+
+def _at_least(value, target):
+    return min(1.0, value / target)
+
+
+def _near(value, target):
+    deviation = abs(value / target - 1)
+    return 1.0 if deviation <= TARGET_TOLERANCE else max(0.0, 1.0 - (deviation - TARGET_TOLERANCE) / 0.35)
+
+
+def daily_nutrients(diet, db=None):
+    """(days x NUTRIENTS) array of estimated intake, plus matched and total dish counts."""
+    db = db or food_database()
+    days = np.zeros((len(diet), len(NUTRIENTS)))
+    matched = total = 0
+    for i, row in enumerate(diet):
+        for meal in MEALS:
+            vec, hits, misses = db.estimate_meal(row.get(meal, ""))
+            days[i] += vec
+            matched += len(hits)
+            total += len(hits) + len(misses)
+    return days, matched, total
+
+
+def score_value(score):
+    """Numeric part of a "7.5/10" score (older plans carry only the string); None if there is none."""
+    m = re.match(r"\s*(\d+(?:\.\d+)?)", str(score))
+    return float(m.group(1)) if m else None
+
+
+def score_diet(diet, macros=None, db=None):
+    """who_analysis dict ({"score", "value", "feedback", "estimated"}) computed from the meals alone."""
+    with timed("who_score", days=len(diet)):
+        days, matched, total = daily_nutrients(diet, db)
+        if not matched:
+            return {"score": "N/A", "value": None, "feedback": "None of the dishes are in the food database yet, so the plan could not be scored.", "estimated": {}}
+        avg = dict(zip(NUTRIENTS, days.mean(axis=0)))
+        kcal = max(avg["kcal"], 1.0)
+        shares = {
+            "free_sugar": avg["free_sugar_g"] * KCAL_PER_G_SUGAR / kcal,
+            "fat": avg["fat_g"] * KCAL_PER_G_FAT / kcal,
+            "sat_fat": avg["sat_fat_g"] * KCAL_PER_G_FAT / kcal,
+        }
+        checks = {k: _at_most(shares[k], limit) for k, limit in ENERGY_SHARE_LIMITS.items()}
+        checks["sodium"] = _at_most(avg["sodium_mg"], SODIUM_LIMIT_MG)
+        checks["produce"] = _at_least(avg["produce_g"], PRODUCE_TARGET_G)
+        checks["fiber"] = _at_least(avg["fiber_g"], FIBER_TARGET_G)
+        if macros:
+            checks["energy"] = _near(avg["kcal"], float(macros["daily_calories"]))
+            checks["protein"] = _near(avg["protein_g"], float(macros["protein_grams"]))
+        value = sum(WEIGHTS[k] * s for k, s in checks.items()) / sum(WEIGHTS[k] for k in checks) * 10
+        value = round(value * 2) / 2
+
+    notes = {
+        "energy": lambda: f"Meals add up to about {avg['kcal']:.0f} kcal/day against the {macros['daily_calories']} kcal target.",
+        "protein": lambda: f"Protein is about {avg['protein_g']:.0f} g/day against the {macros['protein_grams']} g target.",
+        "free_sugar": lambda: f"Free sugars are {shares['free_sugar']:.0%} of energy; WHO advises under 10%.",
+        "fat": lambda: f"Total fat is {shares['fat']:.0%} of energy; WHO advises under 30%.",
+        "sat_fat": lambda: f"Saturated fat is {shares['sat_fat']:.0%} of energy; WHO advises under 10%.",
+        "sodium": lambda: f"Sodium is about {avg['sodium_mg']:,.0f} mg/day; WHO advises under 2,000 mg (5 g salt).",
+        "produce": lambda: f"Fruit and vegetables come to about {avg['produce_g']:.0f} g/day; WHO recommends at least 400 g.",
+        "fiber": lambda: f"Fibre is about {avg['fiber_g']:.0f} g/day; aim for at least 25 g.",
+    }
+    misses = sorted((k for k, s in checks.items() if s < 1), key=lambda k: WEIGHTS[k] * (1 - checks[k]), reverse=True)
+    feedback = " ".join(notes[k]() for k in misses[:3]) or "Meets WHO guidance on sugars, fats, salt, fruit & vegetables and fibre."
+    feedback += f" (Estimated from {matched} of {total} dishes.)"
+    estimated = {k: round(float(v), 1) for k, v in avg.items()}
+    return {"score": f"{value:g}/10", "value": value, "feedback": feedback, "estimated": estimated}
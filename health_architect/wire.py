@@ -0,0 +1,216 @@
+"""Compact, schema-constrained wire format for model output.
+
+Instead of keyed JSON that repeats "day", "breakfast", ... on every row, the model
+returns one short key per section and each table as rows of positional columns:
+
+    {"o": ["tip", ...], "m": [protein, carbs, fats, kcal],
+     "d": [["Mon", "breakfast", "lunch", "dinner"], ...],
+     "x": [["Mon", "workout", "duration", "intensity"], ...]}
+
+The shape is enforced with the SDK's JSON response schema. decode() expands it
+back into the plan dict the UI renders; repair() fixes what it can per section and
+reports the sections that must be re-requested.
+"""
+import json
+import re
+
+OVERVIEW, MACROS, WHO, DIET, WORKOUT = "o", "m", "w", "d", "x"
+MACRO_COLUMNS = ("protein_grams", "carbs_grams", "fats_grams", "daily_calories")
+DIET_COLUMNS = ("day", "breakfast", "lunch", "dinner")
+WORKOUT_COLUMNS = ("day", "workout", "duration", "intensity")
+PLAN_KEYS = {OVERVIEW: "overview", MACROS: "macros", WHO: "who_analysis", DIET: "diet", WORKOUT: "workout"}
+WIRE_KEYS = {v: k for k, v in PLAN_KEYS.items()}
+TABLE_COLUMNS = {DIET: DIET_COLUMNS, WORKOUT: WORKOUT_COLUMNS}
+DAYS = 7
+
+
+def _rows(width, min_items=DAYS):
+    return {"type": "array", "min_items": min_items,
+            "items": {"type": "array", "min_items": width, "max_items": width, "items": {"type": "string"}}}
+
+
+def response_schema(include_macros=True):
+    # who_analysis is scored locally (who.py), so the model is never asked for it.
+    properties = {
+        OVERVIEW: {"type": "array", "items": {"type": "string"}},
+        DIET: _rows(len(DIET_COLUMNS)),
+        WORKOUT: _rows(len(WORKOUT_COLUMNS)),
+    }
+    if include_macros:
+        properties[MACROS] = {"type": "array", "min_items": 4, "max_items": 4, "items": {"type": "integer"}}
+    return {"type": "object", "properties": properties, "required": list(properties)}
+
+
+def generation_config(include_macros=True):
+    return {"response_mime_type": "application/json", "response_schema": response_schema(include_macros)}
+
+
+def delta_generation_config():
+    """Schema for a week-over-week delta: only the rows that change, so tables may be short or empty."""
+    properties = {
+        OVERVIEW: {"type": "array", "items": {"type": "string"}},
+        DIET: _rows(len(DIET_COLUMNS), min_items=0),
+        WORKOUT: _rows(len(WORKOUT_COLUMNS), min_items=0),
+    }
+    schema = {"type": "object", "properties": properties, "required": list(properties)}
+    return {"response_mime_type": "application/json", "response_schema": schema}
+
+
+def format_instructions(include_macros=True):
+    lines = [
+        "Return compact JSON with these keys, in this order:",
+        '  "o": 3 short overview tips',
+    ]
+    if include_macros:
+        lines.append(f'  "m": [{", ".join(MACRO_COLUMNS)}] as integers')
+    lines += [
+        f'  "d": {DAYS} rows of [{", ".join(DIET_COLUMNS)}]',
+        f'  "x": {DAYS} rows of [{", ".join(WORKOUT_COLUMNS)}]',
+        "Use plain strings in every row; no extra keys.",
+    ]
+    return "\n    ".join(lines)
+
+
+def encode(plan):
+    """Plan dict -> compact dict (used by the stub backend and for token accounting)."""
+    compact = {}
+    if "overview" in plan:
+        compact[OVERVIEW] = list(plan["overview"])
+    if "macros" in plan:
+        compact[MACROS] = [plan["macros"][c] for c in MACRO_COLUMNS]
+    if "who_analysis" in plan:
+        compact[WHO] = [plan["who_analysis"]["score"], plan["who_analysis"]["feedback"]]
+    for key, columns in TABLE_COLUMNS.items():
+        if PLAN_KEYS[key] in plan:
+            compact[key] = [[row[c] for c in columns] for row in plan[PLAN_KEYS[key]]]
+    return compact
+
+
+def decode_row(key, row):
+    return dict(zip(TABLE_COLUMNS[key], row))
+
+
+def decode_section(key, value):
+    """Expand one compact section into (plan_key, plan_value)."""
+    if key == MACROS:
+        return "macros", dict(zip(MACRO_COLUMNS, value))
+    if key == WHO:
+        return "who_analysis", {"score": value[0], "feedback": value[1]}
+    if key in TABLE_COLUMNS:
+        return PLAN_KEYS[key], [decode_row(key, row) for row in value]
+    return PLAN_KEYS.get(key, key), value
+
+
+def _repair_table(key, rows):
+    columns = TABLE_COLUMNS[key]
+    fixed = []
+    for row in rows if isinstance(rows, list) else []:
+        if isinstance(row, dict):
+            row = [row.get(c, "") for c in columns]
+        if not isinstance(row, list) or not row:
+            continue
+        row = [str(v).strip() for v in row[:len(columns)]] + [""] * (len(columns) - len(row))
+        if any(row[1:]):
+            fixed.append(row)
+    return fixed if fixed else None
+
+
+def _repair_section(key, value):
+    """Best-effort fix of one section; returns None when it has to be re-requested."""
+    try:
+        if key == OVERVIEW:
+            tips = [str(v).strip() for v in (value if isinstance(value, list) else [value]) if str(v).strip()]
+            return tips or None
+        if key == MACROS:
+            if isinstance(value, dict):
+                value = [value.get(c) for c in MACRO_COLUMNS]
+            numbers = [int(round(float(re.sub(r"[^\d.]", "", str(v))))) for v in value]
+            return numbers if len(numbers) == len(MACRO_COLUMNS) else None
+        if key == WHO:
+            if isinstance(value, dict):
+                value = [value.get("score", ""), value.get("feedback", "")]
+            score, feedback = str(value[0]).strip(), str(value[1]).strip() if len(value) > 1 else ""
+            if re.fullmatch(r"\d+(\.\d+)?", score):
+                score += "/10"
+            return [score, feedback] if re.fullmatch(r"\d+(\.\d+)?/10", score) else None
+        if key in TABLE_COLUMNS:
+            return _repair_table(key, value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    return value
+
+
+def normalize(obj):
+    """Map keyed section names onto wire keys, so a model that ignores the schema still decodes."""
+    return {WIRE_KEYS.get(k, k): v for k, v in obj.items()}
+
+
+def repair(compact, expected):
+    """Return (fixed compact dict, list of wire keys that are missing or unrepairable)."""
+    compact = normalize(compact)
+    fixed, invalid = {}, []
+    for key in expected:
+        value = _repair_section(key, compact.get(key)) if key in compact else None
+        if value is None:
+            invalid.append(key)
+        else:
+            fixed[key] = value
+    return fixed, invalid
+
+
+def merge_rows(key, previous, changed):
+    """Overlay repaired `changed` rows onto `previous` plan rows by day.
+
+    Returns (rows, names of the days that changed); days the delta does not mention
+    are carried over untouched.
+    """
+    rows = [dict(r) for r in previous]
+    index = {r["day"].casefold(): i for i, r in enumerate(rows)}
+    days = []
+    for row in _repair_table(key, changed) or []:
+        new = decode_row(key, row)
+        i = index.get(new["day"].casefold())
+        if i is None or rows[i] == new:
+            continue
+        rows[i] = new
+        days.append(new["day"])
+    return rows, days
+
+
+def decode(compact):
+    return dict(decode_section(k, v) for k, v in compact.items())
+
+
+def decode_event(event):
+    """Parser event in wire keys -> plan event, or None while the fragment is unusable."""
+    kind, key, value = event
+    key = WIRE_KEYS.get(key, key)
+    if key not in PLAN_KEYS:
+        return None
+    if kind == "item":
+        rows = _repair_table(key, [value]) if key in TABLE_COLUMNS else None
+        return ("item", PLAN_KEYS[key], decode_row(key, rows[0])) if rows else None
+    value = _repair_section(key, value)
+    return None if value is None else ("section", *decode_section(key, value))
+
+
+def estimate_tokens(text):
+    """~4 characters per token; good enough to compare two encodings of the same plan."""
+    return max(1, len(text) // 4)
+
+
+def token_savings(plan, compact_text, compact_output_tokens=None, rerequest_tokens=0):
+    """Tokens the keyed format would have cost vs what the compact format did, in one unit.
+
+    Both encodings are sized with estimate_tokens(); when the backend reported the real
+    output count of the compact response, the keyed estimate is scaled by the same ratio
+    so both sides are tokenizer counts. Tokens spent re-requesting broken sections are
+    charged to the compact format.
+    """
+    verbose = estimate_tokens(json.dumps({k: v for k, v in plan.items() if k in WIRE_KEYS}))
+    compact = estimate_tokens(compact_text)
+    if compact_output_tokens:
+        verbose, compact = round(verbose * compact_output_tokens / compact), compact_output_tokens
+    saved = verbose - compact - rerequest_tokens
+    return {"verbose_tokens": verbose, "compact_tokens": compact, "rerequest_tokens": rerequest_tokens,
+            "saved_tokens": saved, "saved_pct": round(100 * saved / verbose, 1)}